@@ -1,40 +1,76 @@
 import os
-from flask import Flask, request, jsonify, render_template
+import json
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
-from client import Neo4jClient, find_literature
+from client import DEFAULT_PAGE_SIZE, Neo4jClient, find_literature, \
+    literature_cache
 from autocomplete_blueprint import auto_blueprint
+from schema import setup_schema
+from ui_blueprint import ui_blueprint
 
 
 app = Flask(__name__)
 app.register_blueprint(auto_blueprint, url_prefix="/autocomplete")
+app.register_blueprint(ui_blueprint)
 CORS(app, resources={r"/*": {"origins": "*"}})
 
 
+# Indexes are set up when the server starts, see gunicorn.conf.py
 client = Neo4jClient()
 
 
-@app.route("/")
-def landing_page():
-    return render_template("landing_page.html")
-
-
-@app.route("/ui")
-def ui_page():
-    return render_template("ui.html")
+def get_int_arg(name):
+    """Return an integer query argument, or None if it's not given."""
+    value = request.args.get(name)
+    if not value:
+        return None
+    value = int(value)
+    if value < 1:
+        raise ValueError(f"{name} must be positive")
+    return value
 
 
 @app.route("/v1/alerts", methods=["GET"])
 def search():
-    disease = request.args.get("disease")
-    geolocation = request.args.get("geolocation")
-    pathogen = request.args.get("pathogen")
-    timestamp = request.args.get("timestamp")
-    symptom = request.args.get("symptom")
-    limit = request.args.get("limit")
-
-    search_results = client.query_graph(
-        disease, geolocation, pathogen, timestamp, symptom, limit
-    )
+    entities = {
+        "disease": request.args.get("disease"),
+        "geolocation": request.args.get("geolocation"),
+        "pathogen": request.args.get("pathogen"),
+        "timestamp": request.args.get("timestamp"),
+        "symptom": request.args.get("symptom"),
+    }
+    cursor = request.args.get("cursor")
+    response_format = request.args.get("format", "json")
+    try:
+        limit = get_int_arg("limit")
+        page_size = get_int_arg("page_size")
+    except ValueError:
+        return "limit and page_size must be positive integers", 400
+
+    # Results are written one per line as they arrive from the database
+    if response_format == "ndjson":
+        if page_size or cursor:
+            return "Pages can't be streamed, use limit instead", 400
+        results = client.stream_alerts(**entities, limit=limit)
+        return Response(
+            stream_with_context(json.dumps(result) + "\n"
+                                for result in results),
+            mimetype="application/x-ndjson",
+        )
+    # Pages are ordered and continued with the returned cursor
+    if page_size or cursor:
+        if limit:
+            return "Use either limit or page_size", 400
+        try:
+            alerts, next_cursor = client.query_alerts_page(
+                **entities, page_size=page_size or DEFAULT_PAGE_SIZE,
+                cursor=cursor
+            )
+        except ValueError as e:
+            return str(e), 400
+        return jsonify({"alerts": alerts, "next_cursor": next_cursor})
+
+    search_results = client.query_graph(**entities, limit=limit)
     return jsonify(search_results)
 
 
@@ -74,6 +110,16 @@ def find_literature_api():
     return jsonify(find_literature(mesh_ids, limit=limit))
 
 
+@app.route("/v1/find_literature/cache_stats", methods=["GET"])
+def find_literature_cache_stats():
+    return jsonify(literature_cache.stats())
+
+
+@app.route("/v1/pool_metrics", methods=["GET"])
+def pool_metrics():
+    return jsonify(client.pool_metrics())
+
+
 @app.route("/v1/healthcheck", methods=["GET"])
 def healthcheck():
     return "OK", 200
@@ -81,4 +127,5 @@ def healthcheck():
 
 # For local debugging
 if __name__ == '__main__':
+    setup_schema()
     app.run()
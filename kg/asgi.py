@@ -0,0 +1,161 @@
+"""
+An ASGI variant of the REST API in api.py, served with uvicorn.
+
+Graph queries run on the async Neo4j driver, so that many concurrent
+queries overlap in one process instead of each holding a worker. Routes
+that don't query the graph run in a thread pool. The landing page, web UI
+and static files are served by a Flask app mounted under this one, which
+only has the UI blueprint and so doesn't connect to the graph.
+"""
+
+import os
+import json
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from fastapi import APIRouter, FastAPI, HTTPException, Query
+from flask import Flask
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.wsgi import WSGIMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
+
+from autocomplete_blueprint import TRIE_BY_ENDPOINT, get_suggestions
+from client import DEFAULT_PAGE_SIZE, AsyncNeo4jClient, find_literature, \
+    literature_cache
+from schema import setup_schema
+from ui_blueprint import ui_blueprint
+
+
+client: Optional[AsyncNeo4jClient] = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global client
+    # The async driver is created in the event loop that uses it
+    client = AsyncNeo4jClient()
+    # Indexes are set up once with a short-lived sync driver in a thread
+    await asyncio.to_thread(setup_schema)
+    yield
+    await client.close()
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"],
+                   allow_headers=["*"])
+
+
+@app.get("/v1/alerts")
+async def search(
+    disease: Optional[str] = None,
+    geolocation: Optional[str] = None,
+    pathogen: Optional[str] = None,
+    timestamp: Optional[str] = None,
+    symptom: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    page_size: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = None,
+    format: str = "json",
+):
+    entities = {
+        "disease": disease,
+        "geolocation": geolocation,
+        "pathogen": pathogen,
+        "timestamp": timestamp,
+        "symptom": symptom,
+    }
+    # Results are written one per line as they arrive from the database
+    if format == "ndjson":
+        if page_size or cursor:
+            raise HTTPException(
+                status_code=400,
+                detail="Pages can't be streamed, use limit instead")
+        results = client.stream_alerts(**entities, limit=limit)
+        return StreamingResponse(
+            (json.dumps(result) + "\n" async for result in results),
+            media_type="application/x-ndjson",
+        )
+    # Pages are ordered and continued with the returned cursor
+    if page_size or cursor:
+        if limit:
+            raise HTTPException(status_code=400,
+                                detail="Use either limit or page_size")
+        try:
+            alerts, next_cursor = await client.query_alerts_page(
+                **entities, page_size=page_size or DEFAULT_PAGE_SIZE,
+                cursor=cursor
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return {"alerts": alerts, "next_cursor": next_cursor}
+
+    return await client.query_graph(**entities, limit=limit)
+
+
+# Endpoint to load alert from the alerts folder and then return
+# the content of the txt file
+@app.get("/v1/alerts/{alert_id}", response_class=PlainTextResponse)
+def get_alert(alert_id: str):
+    fname = f"alerts/{alert_id}.txt"
+    if not os.path.isfile(fname):
+        raise HTTPException(status_code=404, detail="Alert not found")
+    with open(fname, "r") as f:
+        return f.read()
+
+
+# Endpoint to return indicator data for a given
+# country based on a simple string-based filter
+@app.get("/v1/indicators")
+async def get_indicators(
+    geolocation: Optional[str] = None,
+    indicator_filter: Optional[str] = None,
+):
+    if geolocation is None:
+        raise HTTPException(status_code=400, detail="Country not specified")
+    return await client.query_indicators(geolocation, indicator_filter)
+
+
+@app.get("/v1/text_relations")
+async def get_text_relations(text: str):
+    return await client.annotate_text_query(text)
+
+
+@app.get("/v1/find_literature")
+def find_literature_api(mesh_ids: str, limit: int = 20):
+    return find_literature(mesh_ids.split(","), limit=limit)
+
+
+@app.get("/v1/find_literature/cache_stats")
+def find_literature_cache_stats():
+    return literature_cache.stats()
+
+
+@app.get("/v1/pool_metrics")
+def pool_metrics():
+    return client.pool_metrics()
+
+
+@app.get("/v1/healthcheck", response_class=PlainTextResponse)
+def healthcheck():
+    return "OK"
+
+
+autocomplete_router = APIRouter()
+
+
+def add_autocomplete_route(endpoint: str) -> None:
+    def autocomplete(prefix: str, top_n: int = 100):
+        return get_suggestions(endpoint, prefix, top_n)
+
+    autocomplete_router.add_api_route(endpoint, autocomplete, methods=["GET"])
+
+
+for endpoint in TRIE_BY_ENDPOINT:
+    add_autocomplete_route(endpoint)
+
+app.include_router(autocomplete_router, prefix="/autocomplete")
+# Everything else, i.e., the landing page, web UI and static files
+ui_app = Flask(__name__)
+ui_app.register_blueprint(ui_blueprint)
+app.mount("/", WSGIMiddleware(ui_app))
@@ -8,86 +8,80 @@ from flask import Blueprint, request, jsonify
 
 auto_blueprint = Blueprint("autocomplete", __name__, url_prefix="/autocomplete")
 
+#: The lookup trie in get_lookups.py used by each autocomplete endpoint
+TRIE_BY_ENDPOINT = {
+    "/geolocation/alerts": "geoloc_alerts_trie",
+    "/geolocation/indicators": "geoloc_indicators_trie",
+    "/diseases": "disease_trie",
+    "/pathogens": "pathogen_trie",
+    "/symptoms": "disease_trie",
+    "/indicators": "indicator_trie",
+    "/alerts": "alert_trie",
+}
+
+
+def get_suggestions(endpoint, prefix, top_n=100):
+    """Get the autocomplete suggestions of an endpoint for a prefix."""
+    if ":" in prefix:
+        return []
+    top_n = min(int(top_n), 100)
+    import get_lookups
+
+    trie = getattr(get_lookups, TRIE_BY_ENDPOINT[endpoint])
+    return trie.case_insensitive_search(prefix, top_n=top_n)
+
 
 @auto_blueprint.route("/geolocation/alerts", methods=["GET"])
 def autocomplete_geolocations_alerts():
     """Get the autocomplete suggestions for geolocations when querying for alerts"""
-    prefix = request.args.get("prefix")
-    if ":" in prefix:
-        return jsonify([])
-    top_n = min(int(request.args.get("top_n", 100)), 100)
-    from get_lookups import geoloc_alerts_trie
-
-    return jsonify(geoloc_alerts_trie.case_insensitive_search(prefix, top_n=top_n))
+    return jsonify(get_suggestions(
+        "/geolocation/alerts", request.args.get("prefix"), request.args.get("top_n", 100)
+    ))
 
 
 @auto_blueprint.route("/geolocation/indicators", methods=["GET"])
 def autocomplete_geolocations_indicators():
     """Get the autocomplete suggestions for geolocations when querying for geolocation-indicator data."""
-    prefix = request.args.get("prefix")
-    if ":" in prefix:
-        return jsonify([])
-    top_n = min(int(request.args.get("top_n", 100)), 100)
-    from get_lookups import geoloc_indicators_trie
-
-    return jsonify(geoloc_indicators_trie.case_insensitive_search(prefix, top_n=top_n))
+    return jsonify(get_suggestions(
+        "/geolocation/indicators", request.args.get("prefix"), request.args.get("top_n", 100)
+    ))
 
 
 @auto_blueprint.route("/diseases", methods=["GET"])
 def autocomplete_diseases():
     """Get the autocomplete suggestions for diseases."""
-    prefix = request.args.get("prefix")
-    if ":" in prefix:
-        return jsonify([])
-    top_n = min(int(request.args.get("top_n", 100)), 100)
-    from get_lookups import disease_trie
-
-    return jsonify(disease_trie.case_insensitive_search(prefix, top_n=top_n))
+    return jsonify(get_suggestions(
+        "/diseases", request.args.get("prefix"), request.args.get("top_n", 100)
+    ))
 
 
 @auto_blueprint.route("/pathogens", methods=["GET"])
 def autocomplete_pathogens():
     """Get the autocomplete suggestions for pathogens."""
-    prefix = request.args.get("prefix")
-    if ":" in prefix:
-        return jsonify([])
-    top_n = min(int(request.args.get("top_n", 100)), 100)
-    from get_lookups import pathogen_trie
-
-    return jsonify(pathogen_trie.case_insensitive_search(prefix, top_n=top_n))
+    return jsonify(get_suggestions(
+        "/pathogens", request.args.get("prefix"), request.args.get("top_n", 100)
+    ))
 
 
 @auto_blueprint.route("/symptoms", methods=["GET"])
 def autocomplete_symptoms():
     """Get the autocomplete suggestions for symptoms."""
-    prefix = request.args.get("prefix")
-    if ":" in prefix:
-        return jsonify([])
-    top_n = min(int(request.args.get("top_n", 100)), 100)
-    from get_lookups import disease_trie
-
-    return jsonify(disease_trie.case_insensitive_search(prefix, top_n=top_n))
+    return jsonify(get_suggestions(
+        "/symptoms", request.args.get("prefix"), request.args.get("top_n", 100)
+    ))
 
 
 @auto_blueprint.route("/indicators", methods=["GET"])
 def autocomplete_indicators():
     """Get the autocomplete suggestions for indicators."""
-    prefix = request.args.get("prefix")
-    if ":" in prefix:
-        return jsonify([])
-    top_n = min(int(request.args.get("top_n", 100)), 100)
-    from get_lookups import indicator_trie
-
-    return jsonify(indicator_trie.case_insensitive_search(prefix, top_n=top_n))
+    return jsonify(get_suggestions(
+        "/indicators", request.args.get("prefix"), request.args.get("top_n", 100)
+    ))
 
 
 @auto_blueprint.route("/alerts", methods=["GET"])
 def autocomplete_alerts():
     """Get the autocomplete suggestions for alerts."""
-    prefix = request.args.get("prefix")
-    if ":" in prefix:
-        return jsonify([])
-    top_n = min(int(request.args.get("top_n", 100)), 100)
-    from get_lookups import alert_trie
-
-    return jsonify(alert_trie.case_insensitive_search(prefix, top_n=top_n))
+    return jsonify(get_suggestions(
+        "/alerts", request.args.get("prefix"), request.args.get("top_n", 100)
+    ))
@@ -0,0 +1,183 @@
+"""
+Benchmarks of graph assembly steps, run from the kg folder, e.g.,
+
+    python benchmark.py alerts --sizes 1000 10000 60000
+
+to time the alert relation assembler for increasing numbers of alerts, or
+
+    python benchmark.py queries --compare
+
+to time the main query shapes of the API against the running graph with
+and without its indexes.
+"""
+
+import os
+import json
+import time
+import argparse
+
+from build import NER_OUTPUT, get_alert_relations, get_alert_timestamps, \
+    get_outbreak_df
+
+
+def time_call(func, *args, repeat=3):
+    """Return the best wall time in seconds of calling a function."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def list_alert_relations(terms_by_alert, timestamps):
+    """Return alert nodes and edges as lists, generating all of them."""
+    nodes, edges = get_alert_relations(terms_by_alert, timestamps)
+    return list(nodes), list(edges)
+
+
+def get_alert_relations_by_scan(terms_by_alert):
+    """Look up alert timestamps by scanning the outbreak table per alert.
+
+    This is how alert timestamps were looked up before the join on archive
+    numbers, and is kept here as a baseline.
+    """
+    outbreak_df = get_outbreak_df()
+    timestamps = {}
+    for archive_number in terms_by_alert:
+        matching_alerts_df = outbreak_df[outbreak_df["archiveNumber"] ==
+                                         archive_number]
+        if matching_alerts_df.shape[0] > 0:
+            timestamps[archive_number] = \
+                str(matching_alerts_df.iloc[0]["datePublished"])
+    return list_alert_relations(terms_by_alert, timestamps)
+
+
+def benchmark_alert_relations(sizes, scan_limit=5000, repeat=3):
+    """Print the runtime of the alert relation assembler by alert count.
+
+    Parameters
+    ----------
+    sizes :
+        The numbers of alerts to assemble relations for.
+    scan_limit :
+        The largest number of alerts to also time the per-alert scan
+        baseline for, since it grows with alerts times outbreak rows.
+    repeat :
+        The number of runs to take the best time of.
+    """
+    with open(os.path.join(NER_OUTPUT,
+                           'promed_ner_terms_by_alert.json'), 'r') as fh:
+        terms_by_alert = json.load(fh)
+    archive_numbers = list(terms_by_alert)
+    print(f'{"alerts":>8} {"join (s)":>10} {"us/alert":>10} {"scan (s)":>10}')
+    for size in sizes:
+        sample = {archive_number: terms_by_alert[archive_number]
+                  for archive_number in archive_numbers[:size]}
+        join_time = time_call(
+            lambda: list_alert_relations(sample, get_alert_timestamps()),
+            repeat=repeat
+        )
+        if len(sample) <= scan_limit:
+            scan_time = time_call(get_alert_relations_by_scan, sample,
+                                  repeat=1)
+            scan_str = f'{scan_time:10.3f}'
+        else:
+            scan_str = f'{"-":>10}'
+        print(f'{len(sample):8d} {join_time:10.3f} '
+              f'{1e6 * join_time / max(len(sample), 1):10.1f} {scan_str}')
+
+
+def get_query_shapes(client):
+    """Return the main query shapes of the API with arguments from the graph.
+
+    Parameters
+    ----------
+    client :
+        The Neo4jClient to query with.
+
+    Returns
+    -------
+    :
+        Functions running each query shape, by name.
+    """
+    from client import COOCCURRING_ALERTS_QUERY, DIRECT_RELATIONS_QUERY
+
+    def get_mentioned(label):
+        return client.query_tx(f'MATCH (n:alert)-[:mentions]->(m:{label}) '
+                               f'WHERE n.timestamp IS NOT NULL '
+                               f'RETURN m.curie, n.timestamp LIMIT 1')[0]
+
+    disease, timestamp = get_mentioned('disease')
+    geolocation, _ = get_mentioned('geoloc')
+    pathogen, _ = get_mentioned('pathogen')
+    [[indicator_geolocation]] = client.query_tx(
+        'MATCH (g:geoloc)-[:has_indicator]->(:indicator) '
+        'RETURN g.curie LIMIT 1')
+    curies = [disease, geolocation, pathogen]
+    return {
+        'alerts by timestamp': lambda: client.query_graph(timestamp=timestamp),
+        'alerts by disease': lambda: client.query_graph(disease=disease),
+        'alerts by geolocation':
+            lambda: client.query_graph(geolocation=geolocation),
+        'alerts by pathogen': lambda: client.query_graph(pathogen=pathogen),
+        'indicators by name':
+            lambda: client.query_indicators(indicator_geolocation, 'rate'),
+        'relations of terms':
+            lambda: client.query_tx(DIRECT_RELATIONS_QUERY, curies=curies),
+        'alerts of terms':
+            lambda: client.query_tx(COOCCURRING_ALERTS_QUERY, curies=curies),
+    }
+
+
+def benchmark_queries(repeat=3, compare=False):
+    """Print the runtime of the main query shapes of the API.
+
+    Parameters
+    ----------
+    repeat :
+        The number of runs to take the best time of.
+    compare :
+        If True, the indexes of schema.py are dropped to also time the
+        queries without them, and then recreated. Only use this on a
+        database that nothing else is using.
+    """
+    from client import Neo4jClient
+    from schema import drop_schema, ensure_schema
+
+    client = Neo4jClient()
+    shapes = get_query_shapes(client)
+    times = {}
+    if compare:
+        drop_schema(client.driver)
+        times['no index (s)'] = {name: time_call(func, repeat=repeat)
+                                 for name, func in shapes.items()}
+    ensure_schema(client.driver)
+    times['indexed (s)'] = {name: time_call(func, repeat=repeat)
+                            for name, func in shapes.items()}
+    print(f'{"query":<25}' + ''.join(f'{column:>14}' for column in times))
+    for name in shapes:
+        print(f'{name:<25}' + ''.join(f'{times[column][name]:14.3f}'
+                                      for column in times))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+    alerts_parser = subparsers.add_parser(
+        'alerts', help='Time the alert relation assembler by alert count')
+    alerts_parser.add_argument('--sizes', type=int, nargs='+',
+                               default=[1000, 5000, 20000, 60000])
+    alerts_parser.add_argument('--scan-limit', type=int, default=5000)
+    alerts_parser.add_argument('--repeat', type=int, default=3)
+    queries_parser = subparsers.add_parser(
+        'queries', help='Time the main query shapes of the API')
+    queries_parser.add_argument('--repeat', type=int, default=3)
+    queries_parser.add_argument('--compare', action='store_true',
+                                help='Also time the queries without indexes')
+    args = parser.parse_args()
+    if args.benchmark == 'alerts':
+        benchmark_alert_relations(args.sizes, args.scan_limit, args.repeat)
+    elif args.benchmark == 'queries':
+        benchmark_queries(args.repeat, args.compare)
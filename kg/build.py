@@ -1,38 +1,30 @@
 import os
 import csv
-import json
+import glob
 import tqdm
-from itertools import combinations
-from collections import Counter
+import argparse
+from functools import lru_cache
+import numpy as np
 import pandas as pd
+from scipy.sparse import csr_matrix, identity, triu
+from concurrent.futures import ProcessPoolExecutor
 
 import gilda
+import indra.resources
 from indra.databases import mesh_client
-from indra.ontology.bio import bio_ontology
 
+from columnar import get_parquet_path, parquet_output_enabled, \
+    read_table, read_terms_by_alert
 from constants import LOCATION_MESH_MAPPING
+from mesh_type_index import DISEASE, GEOLOC, MESH_TYPE_INDEX, PATHOGEN, \
+    MeshTypeIndex, get_mesh_type_index
+from pipeline import Stage, run_pipeline
+from sink import TsvSink, write_tsv
 
-grounder = gilda.get_grounder()
 HERE = os.path.dirname(os.path.abspath(__file__))
 NER_OUTPUT = os.path.join(HERE, os.pardir, 'output')
-
-def is_geoloc(x_db, x_id):
-    if x_db == 'MESH':
-        return mesh_client.mesh_isa(x_id, 'D005842')
-    return False
-
-
-def is_pathogen(x_db, x_id):
-    if x_db == 'MESH':
-        return mesh_client.mesh_isa(x_id, 'D001419') or \
-            mesh_client.mesh_isa(x_id, 'D014780')
-    return False
-
-
-def is_disease(x_db, x_id):
-    if x_db == 'MESH':
-        return mesh_client.is_disease(x_id)
-    return False
+#: The MeSH CURIEs gilda grounds geonames names to, reused across builds
+GEONAME_GROUNDINGS = os.path.join(HERE, 'geoname_groundings.tsv')
 
 
 # Some terms that are very common but too generic to be useful
@@ -42,375 +34,789 @@ exclude_list = {'Disease', 'Health', 'Affected', 'control', 'Animals',
                 'Epidemiology', 'Names', 'submitted', 'Laboratories',
                 'Disease Outbreaks', 'Central', 'strain'}
 
-outbreak_df = pd.read_csv(os.path.join(NER_OUTPUT, 'promed_outbreaks.csv'),
-                          dtype={"archiveNumber": str})
+#: World Bank indicator tables by name, series in more than one table are
+#: assembled from the first one
+INDICATOR_FILES = [
+    ("dev", "world_dev_indicator_data.tsv"),
+    ("health", "world_health_indicator_data.tsv"),
+]
+
 
-outbreak_df["archiveNumber"] = outbreak_df["archiveNumber"].apply(
-    lambda archive_number: archive_number.replace("\"", ""))
+@lru_cache(maxsize=1)
+def get_grounder():
+    """Return the gilda grounder, loaded on first use."""
+    return gilda.get_grounder()
+
+
+@lru_cache(maxsize=1)
+def get_outbreak_df():
+    """Return the ProMED outbreak table, read on first use."""
+    outbreak_df = pd.read_csv(
+        os.path.join(NER_OUTPUT, 'promed_outbreaks.csv'),
+        dtype={"archiveNumber": str}
+    )
+    outbreak_df["archiveNumber"] = outbreak_df["archiveNumber"].apply(
+        lambda archive_number: archive_number.replace("\"", ""))
+    return outbreak_df
 
 
 def assemble_coocurrence():
-    with open(os.path.join(NER_OUTPUT, 'promed_ner_terms_by_alert.json'), 'r') as f:
-        jj = json.load(f)
-
-    pairs = []
-    interesting_pairs = []
-    for alert in tqdm.tqdm(jj):
-        for a, b in combinations(alert, 2):
-            # Normalize for arbitrary order
-            a, b = tuple(sorted([a, b], key=lambda x: x[2]))
-            if a[2] in exclude_list or b[2] in exclude_list:
-                continue
-            for a_, b_ in ((a, b), (b, a)):
-                if (is_geoloc(a_[0], a_[1]) and is_pathogen(b_[0], b_[1])) \
-                    or (is_disease(a_[0], a_[1]) and is_pathogen(b_[0], b_[1])) \
-                    or (is_geoloc(a_[0], a_[1]) and is_disease(b_[0], b_[1])):
-                    interesting_pairs.append((tuple(a), tuple(b)))
-            pairs.append((tuple(a), tuple(b)))
+    terms_by_alert = read_terms_by_alert(
+        os.path.join(NER_OUTPUT, 'promed_ner_terms_by_alert.json'))
+    nodes, edges = get_cooccurrences(terms_by_alert)
 
     node_header = ['curie:ID', 'name:string', ':LABEL']
     edge_header = [':START_ID', ':TYPE', ':END_ID', 'count:int']
-
-    nodes = set()
-    for pair in interesting_pairs:
-        for x in pair:
-            if is_pathogen(x[0], x[1]):
-                ntype = 'pathogen'
-            elif is_geoloc(x[0], x[1]):
-                ntype = 'geoloc'
-            else:
-                ntype = 'disease'
-            nodes.add((x[0] + ':' + x[1], x[2], ntype + ';entity'))
-
-    cnt = Counter(interesting_pairs)
-    edges = set()
-    for (a, b), count in cnt.items():
-        edges.add((a[0] + ':' + a[1], 'occurs_with', b[0] + ':' + b[1], count))
-    with open(os.path.join(HERE, 'cooccurrence_edges.tsv'), 'w') as fh:
-        writer = csv.writer(fh, delimiter='\t')
-        writer.writerows([edge_header] + sorted(list(edges)))
-    with open(os.path.join(HERE, 'cooccurrence_nodes.tsv'), 'w') as fh:
-        writer = csv.writer(fh, delimiter='\t')
-        writer.writerows([node_header] + sorted(list(nodes)))
+    write_tsv(os.path.join(HERE, 'cooccurrence_edges.tsv'), edge_header, edges)
+    write_tsv(os.path.join(HERE, 'cooccurrence_nodes.tsv'), node_header, nodes)
+
+
+def get_cooccurrences(terms_by_alert):
+    """Return co-occurrence edges between geolocations, pathogens and diseases.
+
+    Alerts are encoded as a sparse alert-by-term incidence matrix A so that
+    the number of alerts in which each pair of terms co-occurs is given by
+    the sparse product of A's transpose with A. Pairs are then filtered by
+    type using the type bitmasks of the terms.
+
+    Parameters
+    ----------
+    terms_by_alert : dict[str, list[list[str]]]
+        The (namespace, ID, entry name) of the terms extracted from each
+        alert, by archive number.
+
+    Returns
+    -------
+    nodes : Iterator[tuple]
+        The nodes of terms that have at least one co-occurrence edge.
+    edges : Iterator[tuple]
+        The occurs_with edges, whose source is the term whose name comes
+        first alphabetically, with the number of co-occurrences. A pair is
+        counted twice per alert if it is of interest in both directions.
+    """
+    # Only terms that have a type can be part of a pair of interest
+    terms = {tuple(term) for alert_terms in terms_by_alert.values()
+             for term in alert_terms if term[2] not in exclude_list}
+    terms = [term for term in terms
+             if term[0] == 'MESH' and get_mesh_type_index().get_mask(term[1])]
+    # Terms are ordered by name so that pairs in the upper triangle of the
+    # co-occurrence matrix are in normalized order
+    terms = sorted(terms, key=lambda term: (term[2], term[0], term[1]))
+    term_indices = {term: idx for idx, term in enumerate(terms)}
+
+    rows, columns = [], []
+    for alert_idx, alert_terms in enumerate(terms_by_alert.values()):
+        for term in alert_terms:
+            term_idx = term_indices.get(tuple(term))
+            if term_idx is not None:
+                rows.append(alert_idx)
+                columns.append(term_idx)
+    incidence = csr_matrix((np.ones(len(rows), dtype=np.int32),
+                            (rows, columns)),
+                           shape=(len(terms_by_alert), len(terms)))
+    cooccurrence = triu(incidence.T @ incidence, k=1).tocoo()
+
+    masks = get_mesh_type_index().classify([term[1] for term in terms])
+    disease, pathogen, geoloc = \
+        [(masks & flag) > 0 for flag in (DISEASE, PATHOGEN, GEOLOC)]
+
+    def is_interesting(a, b):
+        return (geoloc[a] & pathogen[b]) | (disease[a] & pathogen[b]) | \
+            (geoloc[a] & disease[b])
+
+    multiplicity = \
+        is_interesting(cooccurrence.row, cooccurrence.col).astype(int) + \
+        is_interesting(cooccurrence.col, cooccurrence.row)
+    keep = multiplicity > 0
+    sources = cooccurrence.row[keep]
+    targets = cooccurrence.col[keep]
+    counts = cooccurrence.data[keep] * multiplicity[keep]
+
+    curies = [f'{term[0]}:{term[1]}' for term in terms]
+    edges = ((curies[source], 'occurs_with', curies[target], int(count))
+             for source, target, count in zip(sources.tolist(),
+                                              targets.tolist(),
+                                              counts.tolist()))
+    ntypes = np.where(pathogen, 'pathogen',
+                      np.where(geoloc, 'geoloc', 'disease'))
+    nodes = ((curies[term_idx], terms[term_idx][2],
+              ntypes[term_idx] + ';entity')
+             for term_idx in np.union1d(sources, targets).tolist())
+    return nodes, edges
 
 
 def assemble_mesh_hierarchy():
-    edges = set()
-    nodes = set()
-    # Assemble the subtree of diseases, pathogens and geolocations
-    for mesh_id, mesh_name in mesh_client.mesh_id_to_name.items():
-        is_dis = is_disease('MESH', mesh_id)
-        is_pat = is_pathogen('MESH', mesh_id)
-        is_geo = is_geoloc('MESH', mesh_id)
-        if not any([is_dis, is_pat, is_geo]):
-            continue
-        if is_dis:
-            node_type = 'disease'
-        elif is_pat:
-            node_type = 'pathogen'
-        else:
-            node_type = 'geoloc'
-        nodes.add((f'MESH:{mesh_id}', mesh_name, node_type + ';entity'))
-        parent_ids = list(bio_ontology.child_rel('MESH', mesh_id, {'isa'}))
-        new_edges = set()
-        for _, parent in parent_ids:
-            if is_dis and not is_disease('MESH', parent):
-                continue
-            if is_pat and not is_pathogen('MESH', parent):
-                continue
-            if is_geo and not is_geoloc('MESH', parent):
-                continue
-            new_edges.add((f'MESH:{mesh_id}', 'isa', f'MESH:{parent}'))
-        edges |= new_edges
-    # TODO: add relations to root nodes
     node_header = ['curie:ID', 'name:string', ':LABEL']
     edge_header = [':START_ID', ':TYPE', ':END_ID']
-    with open(os.path.join(HERE, 'mesh_hierarchy_edges.tsv'), 'w') as fh:
-        writer = csv.writer(fh, delimiter='\t')
-        writer.writerows([edge_header] + sorted(list(edges)))
-    with open(os.path.join(HERE, 'mesh_hierarchy_nodes.tsv'), 'w') as fh:
-        writer = csv.writer(fh, delimiter='\t')
-        writer.writerows([node_header] + sorted(list(nodes)))
+    type_index = get_mesh_type_index()
+    tree_number_to_id = {
+        tree_number: mesh_id
+        for mesh_id, tree_numbers in mesh_client.mesh_id_to_tree_numbers.items()
+        for tree_number in tree_numbers
+    }
+    with TsvSink(os.path.join(HERE, 'mesh_hierarchy_nodes.tsv'),
+                 node_header) as nodes, \
+            TsvSink(os.path.join(HERE, 'mesh_hierarchy_edges.tsv'),
+                    edge_header) as edges:
+        # Assemble the subtree of diseases, pathogens and geolocations
+        for mesh_id, mesh_name in mesh_client.mesh_id_to_name.items():
+            mask = type_index.get_mask(mesh_id)
+            if not mask:
+                continue
+            nodes.add((f'MESH:{mesh_id}', mesh_name,
+                       get_mesh_node_type(mask) + ';entity'))
+            for parent in get_mesh_parents(mesh_id, tree_number_to_id):
+                # Parents need to have all the types of the child
+                if mask & ~type_index.get_mask(parent):
+                    continue
+                edges.add((f'MESH:{mesh_id}', 'isa', f'MESH:{parent}'))
+        # TODO: add relations to root nodes
+
+
+def get_mesh_node_type(mask):
+    """Return the node label of a MeSH term from its type bitmask."""
+    if mask & DISEASE:
+        return 'disease'
+    if mask & PATHOGEN:
+        return 'pathogen'
+    return 'geoloc'
+
+
+def get_mesh_parents(mesh_id, tree_number_to_id):
+    """Return the MeSH IDs of the direct parents of a MeSH term.
+
+    Parents of descriptors are the terms at the tree numbers obtained by
+    removing the last part of each of their tree numbers. Supplementary
+    concepts, which have no tree numbers, are children of the descriptors
+    they are mapped to.
+
+    Parameters
+    ----------
+    mesh_id : str
+        A MeSH ID.
+    tree_number_to_id : dict[str, str]
+        The MeSH ID of each tree number.
+
+    Returns
+    -------
+    set[str]
+        The MeSH IDs of the parents of the term.
+    """
+    if mesh_id in mesh_client.mesh_supp_to_primary:
+        return set(mesh_client.mesh_supp_to_primary[mesh_id])
+    parents = set()
+    for tree_number in mesh_client.mesh_id_to_tree_numbers.get(mesh_id, []):
+        parent_tree_number, _, _ = tree_number.rpartition('.')
+        if parent_tree_number in tree_number_to_id:
+            parents.add(tree_number_to_id[parent_tree_number])
+    return parents
 
 
 def assemble_outbreak_nodes():
-    nodes = set()
-    edges = set()
-    added_outbreak_nodes_index = set()
-    for _, row in outbreak_df.iterrows():
-        outbreak_id = row["ID"]
-        outbreak_name = row["outbreakName"]
-        if outbreak_id not in added_outbreak_nodes_index:
-            added_outbreak_nodes_index.add(outbreak_id)
-            nodes.add((f"outbreak:{outbreak_id}", outbreak_name, 'outbreak'))
-        archive_number = row["archiveNumber"]
-        edges.add((f'promed:{archive_number}', 'has_outbreak',
-                   f"outbreak:{outbreak_id}"))
+    nodes, edges = get_outbreak_relations(get_outbreak_df())
     node_header = ['curie:ID', 'name:string', ':LABEL']
     edge_header = [':START_ID', ':TYPE', ':END_ID']
-    with open(os.path.join(HERE, 'promed_outbreak_nodes.tsv'), 'w') as fh:
-        writer = csv.writer(fh, delimiter='\t')
-        writer.writerows([node_header] + sorted(list(nodes)))
-    with open(os.path.join(HERE, 'promed_alert_outbreak_edges.tsv'), 'w') as fh:
-        writer = csv.writer(fh, delimiter='\t')
-        writer.writerows([edge_header] + sorted(list(edges)))
+    write_tsv(os.path.join(HERE, 'promed_outbreak_nodes.tsv'), node_header, nodes)
+    write_tsv(os.path.join(HERE, 'promed_alert_outbreak_edges.tsv'),
+              edge_header, edges)
+
+
+def get_outbreak_relations(outbreak_df):
+    """Return outbreak nodes and the edges linking alerts to them.
+
+    Nodes are named after the first row of each outbreak.
+    """
+    outbreaks_df = outbreak_df.drop_duplicates("ID")
+    nodes = ((f"outbreak:{outbreak_id}", outbreak_name, 'outbreak')
+             for outbreak_id, outbreak_name
+             in zip(outbreaks_df["ID"], outbreaks_df["outbreakName"]))
+    edges = ((f'promed:{archive_number}', 'has_outbreak',
+              f"outbreak:{outbreak_id}")
+             for archive_number, outbreak_id
+             in zip(outbreak_df["archiveNumber"], outbreak_df["ID"]))
+    return nodes, edges
 
 
 def assemble_alert_relations():
-    with open(os.path.join(NER_OUTPUT, 'promed_ner_terms_by_alert.json'), 'r') as f:
-        terms_by_alert = json.load(f)
-    nodes = set()
-    edges = set()
-    for archive_number, extractions in terms_by_alert.items():
-        matching_alerts_df = outbreak_df[outbreak_df["archiveNumber"] ==
-                                         archive_number]
-        if matching_alerts_df.shape[0] > 0:
-            time_stamp = str(matching_alerts_df.iloc[0]["datePublished"])
-        else:
-            time_stamp = ""
-        nodes.add((f'promed:{archive_number}', archive_number, time_stamp,
-                   'alert'))
-        for ns, id, entry_name in extractions:
-            if entry_name in exclude_list:
-                continue
-            if ns == 'MESH':
-                if is_disease(ns, id) or is_pathogen(ns, id) or is_geoloc(ns, id):
-                    edges.add((f'promed:{archive_number}', 'mentions', f'MESH:{id}'))
+    terms_by_alert = read_terms_by_alert(
+        os.path.join(NER_OUTPUT, 'promed_ner_terms_by_alert.json'))
+    nodes, edges = get_alert_relations(terms_by_alert)
     node_header = ['curie:ID', 'name:string', 'timestamp:string', ':LABEL']
     edge_header = [':START_ID', ':TYPE', ':END_ID']
-    with open(os.path.join(HERE, 'promed_alert_nodes.tsv'), 'w') as fh:
-        writer = csv.writer(fh, delimiter='\t')
-        writer.writerows([node_header] + sorted(list(nodes)))
-    with open(os.path.join(HERE, 'promed_alert_edges.tsv'), 'w') as fh:
-        writer = csv.writer(fh, delimiter='\t')
-        writer.writerows([edge_header] + sorted(list(edges)))
+    write_tsv(os.path.join(HERE, 'promed_alert_nodes.tsv'), node_header, nodes)
+    write_tsv(os.path.join(HERE, 'promed_alert_edges.tsv'), edge_header, edges)
 
 
-def assemble_pathogen_disease_relations():
+def get_alert_timestamps(df=None):
+    """Return the publication date of each alert by archive number.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        A table of outbreaks with archiveNumber and datePublished columns,
+        by default the ProMED outbreak table.
+
+    Returns
+    -------
+    dict[str, str]
+        The datePublished of the first outbreak row of each archive number.
+    """
+    if df is None:
+        df = get_outbreak_df()
+    first_rows = df.drop_duplicates('archiveNumber')
+    return dict(zip(first_rows['archiveNumber'],
+                    first_rows['datePublished'].map(str)))
+
+
+def get_alert_relations(terms_by_alert, timestamps=None):
+    """Return alert nodes and their mentions edges.
+
+    Parameters
+    ----------
+    terms_by_alert : dict[str, list[list[str]]]
+        The (namespace, ID, entry name) of the terms extracted from each
+        alert, by archive number.
+    timestamps : dict[str, str]
+        The publication date of each alert by archive number, by default
+        taken from the ProMED outbreak table.
+
+    Returns
+    -------
+    nodes : Iterator[tuple]
+        The alert nodes.
+    edges : Iterator[tuple]
+        The edges from alerts to the disease, pathogen and geolocation
+        terms they mention, which may repeat.
+    """
+    if timestamps is None:
+        timestamps = get_alert_timestamps()
+    nodes = ((f'promed:{archive_number}', archive_number,
+              timestamps.get(archive_number, ''), 'alert')
+             for archive_number in terms_by_alert)
+
+    mentions = [(archive_number, ns, id, entry_name)
+                for archive_number, extractions in terms_by_alert.items()
+                for ns, id, entry_name in extractions]
+    if not mentions:
+        return nodes, iter(())
+    archive_numbers, namespaces, ids, entry_names = \
+        (np.array(column, dtype=str) for column in zip(*mentions))
+    keep = (namespaces == 'MESH') & \
+        ~np.isin(entry_names, list(exclude_list)) & \
+        (get_mesh_type_index().classify(ids) > 0)
+    edges = ((f'promed:{archive_number}', 'mentions', f'MESH:{id}')
+             for archive_number, id in zip(archive_numbers[keep].tolist(),
+                                           ids[keep].tolist()))
+    return nodes, edges
+
+
+def get_mentioned_term_nodes(terms_by_alert):
+    """Return the nodes of the terms that get_alert_relations links alerts to.
+
+    Parameters
+    ----------
+    terms_by_alert : dict[str, list[list[str]]]
+        The (namespace, ID, entry name) of the terms extracted from each
+        alert, by archive number.
+
+    Returns
+    -------
+    Iterator[tuple]
+        The nodes of the mentioned terms, in the format of the MeSH
+        hierarchy nodes, which may repeat.
+    """
+    type_index = get_mesh_type_index()
+    for extractions in terms_by_alert.values():
+        for ns, id, entry_name in extractions:
+            if ns != 'MESH' or entry_name in exclude_list:
+                continue
+            mask = type_index.get_mask(id)
+            if mask:
+                yield (f'MESH:{id}', mesh_client.mesh_id_to_name.get(
+                    id, entry_name), get_mesh_node_type(mask) + ';entity')
+
+
+@lru_cache(maxsize=None)
+def get_mesh_xrefs(prefix):
+    """Return the MeSH IDs of the terms of a namespace, by ID.
+
+    Parameters
+    ----------
+    prefix : str
+        The lowercase prefix of the namespace, e.g., doid.
+
+    Returns
+    -------
+    dict[str, str]
+        The MeSH ID of each ID of the namespace that has a MeSH xref.
+    """
+    if prefix == 'ncbitaxon':
+        return mesh_client.ncbitaxon_to_mesh
     import pyobo
+    return dict(pyobo.get_filtered_xrefs(prefix, 'mesh'))
+
+
+def map_curies_to_mesh(curies):
+    """Map a column of CURIEs to MeSH CURIEs.
+
+    The xrefs of each namespace are loaded once and applied to all the
+    CURIEs of that namespace at the same time.
+
+    Parameters
+    ----------
+    curies : pandas.Series
+        CURIEs with lowercase prefixes, e.g., doid:10304 or mesh:D009157.
+
+    Returns
+    -------
+    pandas.Series
+        The MeSH CURIE of each CURIE, NaN for ones without a MeSH xref.
+    """
+    parts = curies.str.split(':', n=1, expand=True)
+    prefixes = parts[0].str.lower()
+    ids = parts[1]
+    mesh_curies = pd.Series(np.nan, index=curies.index, dtype=object)
+    for prefix in prefixes.dropna().unique():
+        rows = prefixes == prefix
+        if prefix == 'mesh':
+            mesh_ids = ids[rows].str.upper()
+        else:
+            mesh_ids = ids[rows].map(get_mesh_xrefs(prefix))
+        mesh_curies[rows] = 'MESH:' + mesh_ids.astype(object)
+    return mesh_curies
+
+
+def get_mesh_relations(df, rel_type):
+    """Return edges of the given type between the MeSH mappings of a table.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        A table of relations with :START_ID and :END_ID columns of CURIEs.
+    rel_type : str
+        The type of the edges.
+
+    Returns
+    -------
+    Iterator[tuple]
+        The edges between the MeSH terms the sources and targets map to,
+        skipping relations whose source or target has no MeSH mapping.
+        Edges may repeat.
+    """
+    mapped_df = pd.DataFrame({
+        ':START_ID': map_curies_to_mesh(df[':START_ID']),
+        ':END_ID': map_curies_to_mesh(df[':END_ID']),
+    }).dropna()
+    return zip(mapped_df[':START_ID'], [rel_type] * len(mapped_df),
+               mapped_df[':END_ID'])
+
+
+def assemble_pathogen_disease_relations():
     df = pd.read_csv(os.path.join(HERE, 'pathogen_disease_rels.tsv'), sep='\t')
     df = df[~df[':START_ID'].str.startswith('umls')]
     df = df[~df[':END_ID'].str.startswith('umls')]
-    edges = set()
-    for _, row in df.iterrows():
-        source_ns, source_id = row[':START_ID'].split(':')
-        if source_ns == 'ncbitaxon':
-            mapped_source_id = mesh_client.ncbitaxon_to_mesh.get(source_id)
-        else:
-            mapped_source_id = pyobo.get_xref(source_ns, source_id, 'mesh')
-        if not mapped_source_id:
-            continue
-        target_ns, target_id = row[':END_ID'].split(':')
-        if target_ns == 'ncbitaxon':
-            mapped_target_id = mesh_client.ncbitaxon_to_mesh.get(target_id)
-        else:
-            mapped_target_id = pyobo.get_xref(target_ns, target_id, 'mesh')
-        if not mapped_target_id:
-            continue
-        edges.add((f'MESH:{mapped_source_id}', 'has_pathogen', f'MESH:{mapped_target_id}'))
-    with open(os.path.join(HERE, 'pathogen_disease_edges.tsv'), 'w') as fh:
-        writer = csv.writer(fh, delimiter='\t')
-        writer.writerows([[':START_ID', ':TYPE', ':END_ID']] + sorted(list(edges)))
+    edges = get_mesh_relations(df, 'has_pathogen')
+    write_tsv(os.path.join(HERE, 'pathogen_disease_edges.tsv'),
+              [':START_ID', ':TYPE', ':END_ID'], edges)
 
 
 def assemble_disease_symptom_relations():
-    df = pd.read_csv('disease_phenotype_rels.tsv', sep='\t')
+    df = pd.read_csv(os.path.join(HERE, 'disease_phenotype_rels.tsv'), sep='\t')
+    # Only relations between MeSH terms are kept
     df = df[df[':START_ID'].str.startswith('mesh')]
     df = df[df[':END_ID'].str.startswith('mesh')]
-    edges = set()
+    edges = get_mesh_relations(df, 'has_phenotype')
     edge_header = [':START_ID', ':TYPE', ':END_ID']
-    for _, row in df.iterrows():
-        mesh_disease = row[':START_ID'].upper()
-        mesh_pheno = row[':END_ID'].upper()
-        edges.add((mesh_disease, 'has_phenotype', mesh_pheno))
-    with open(os.path.join(HERE, 'disease_phenotype_edges.tsv'), 'w') as fh:
-        writer = csv.writer(fh, delimiter='\t')
-        writer.writerows([edge_header] + sorted(list(edges)))
-
-
-def assemble_world_indicator_data():
-    dev_nodes, dev_edges, health_nodes, health_edges = set(), set(), set(), set()
-    mesh_node_df = pd.read_csv(os.path.join(HERE, "mesh_hierarchy_nodes.tsv"), sep="\t")
-    country_dev_indicator_df = pd.read_csv(
-        os.path.join(HERE, "world_dev_indicator_data.tsv"), sep="\t"
-    )
-    country_health_indicator_df = pd.read_csv(
-        os.path.join(HERE, "world_health_indicator_data.tsv"), sep="\t"
-    )
+    write_tsv(os.path.join(HERE, 'disease_phenotype_edges.tsv'), edge_header, edges)
 
-    # Removed shared series codes between dev and health indicator data from the
-    # health indicator dataframe
-    dev_series_codes = set(country_dev_indicator_df["Series Code"])
-    health_series_code = set(country_health_indicator_df["Series Code"])
-    health_series_code_diff = health_series_code - dev_series_codes
-    country_health_indicator_df = country_health_indicator_df[
-        country_health_indicator_df["Series Code"].isin(health_series_code_diff)
-    ]
 
-    # Ground World Bank country/region terms using Mesh terms
-    country_dev_indicator_df["Country Name"] = (
-        country_dev_indicator_df["Country Name"]
-        .map(LOCATION_MESH_MAPPING)
-        .fillna(country_dev_indicator_df["Country Name"])
-    )
-    country_health_indicator_df["Country Name"] = (
-        country_health_indicator_df["Country Name"]
-        .map(LOCATION_MESH_MAPPING)
-        .fillna(country_health_indicator_df["Country Name"])
+def assemble_world_indicator_data(indicator_files=INDICATOR_FILES):
+    """Assemble indicator nodes and edges from World Bank data files.
+
+    Parameters
+    ----------
+    indicator_files : list[tuple[str, str]]
+        The name and file of each World Bank indicator table. A series
+        that appears in more than one file is only assembled from the
+        first one.
+    """
+    mesh_node_df = read_table(os.path.join(HERE, "mesh_hierarchy_nodes.tsv"),
+                              columns=["curie:ID", "name:string", ":LABEL"])
+    # Countries are grounded to the first MeSH node with their name, as
+    # long as some geolocation has that name
+    geoloc_names = set(
+        mesh_node_df[mesh_node_df[":LABEL"].str.contains("geoloc")]
+        ["name:string"]
     )
+    first_nodes = mesh_node_df.drop_duplicates("name:string")
+    curie_by_name = {
+        name: curie for curie, name in
+        zip(first_nodes["curie:ID"], first_nodes["name:string"])
+        if name in geoloc_names
+    }
 
     node_header = ["curie:ID", "name:string", ":LABEL"]
     edge_header = [":START_ID", "years_data:string", ":TYPE", ":END_ID"]
-
-    # Filter out countries that can't be grounded to Mesh terms
-    country_dev_indicator_df = pd.merge(
-        country_dev_indicator_df,
-        mesh_node_df[mesh_node_df[":LABEL"].str.contains("geoloc")],
-        left_on="Country Name",
-        right_on="name:string",
-        how="inner",
-    )[country_dev_indicator_df.columns]
-
-    country_health_indicator_df = pd.merge(
-        country_health_indicator_df,
-        mesh_node_df[mesh_node_df[":LABEL"].str.contains("geoloc")],
-        left_on="Country Name",
-        right_on="name:string",
-        how="inner",
-    )[country_health_indicator_df.columns]
-
-    # Process health indicator data
-    for _, row in country_health_indicator_df.iterrows():
-        country_name = row["Country Name"]
-        series_code = row["Series Code"]
-        series_name = row["Series Name"]
-        country_mesh_info = mesh_node_df[mesh_node_df["name:string"] == country_name]
-        indicator_year_data_dict = {}
-
-        # Process indicator year-data only for each row
-        for col, val in row[1:].items():
-            try:
-                float(val)
-            except ValueError:
-                continue
-            indicator_year_data_dict[col[:4]] = round(float(val), 3)
-        indicator_year_data_string = json.dumps(indicator_year_data_dict)
-        country_curie = country_mesh_info.values[0][0]
-        indicator_curie = f"wdi:{series_code}"
-        health_nodes.add((indicator_curie, series_name, "indicator"))
-        health_edges.add(
-            (
-                country_curie,
-                indicator_year_data_string,
-                "has_indicator",
-                indicator_curie,
-            )
-        )
-    with open(os.path.join(HERE, "indicator_health_nodes.tsv"), "w") as fh:
-        writer = csv.writer(fh, delimiter="\t")
-        writer.writerows([node_header] + sorted(list(health_nodes)))
-    with open(os.path.join(HERE, "indicator_health_edges.tsv"), "w") as fh:
-        writer = csv.writer(fh, delimiter="\t")
-        writer.writerows([edge_header] + sorted(list(health_edges)))
-
-    # Process dev indicator data
-    for _, row in country_dev_indicator_df.iterrows():
-        country_name = row["Country Name"]
-        series_code = row["Series Code"]
-        series_name = row["Series Name"]
-        country_mesh_info = mesh_node_df[mesh_node_df["name:string"] == country_name]
-        indicator_year_data_dict = {}
-
-        for col, val in row[1:].items():
-            try:
-                float(val)
-            except ValueError:
-                continue
-            indicator_year_data_dict[col[:4]] = round(float(val), 3)
-
-        indicator_year_data_string = json.dumps(indicator_year_data_dict)
-        country_curie = country_mesh_info.values[0][0]
-        indicator_curie = f"wdi:{series_code}"
-        dev_nodes.add((indicator_curie, series_name, "indicator"))
-        dev_edges.add(
-            (
-                country_curie,
-                indicator_year_data_string,
-                "has_indicator",
-                indicator_curie,
-            )
+    claimed_series_codes = set()
+    for name, fname in indicator_files:
+        indicator_df = pd.read_csv(os.path.join(HERE, fname), sep="\t",
+                                   na_values="..")
+        series_codes = set(indicator_df["Series Code"])
+        indicator_df = indicator_df[
+            ~indicator_df["Series Code"].isin(claimed_series_codes)
+        ]
+        claimed_series_codes |= series_codes
+        nodes, edges = get_indicator_relations(indicator_df, curie_by_name)
+        write_tsv(os.path.join(HERE, f"indicator_{name}_nodes.tsv"),
+                  node_header, nodes)
+        write_tsv(os.path.join(HERE, f"indicator_{name}_edges.tsv"),
+                  edge_header, edges)
+
+
+def get_indicator_relations(indicator_df, curie_by_name):
+    """Return indicator nodes and the edges linking geolocations to them.
+
+    Parameters
+    ----------
+    indicator_df : pandas.DataFrame
+        A World Bank table with a row per country and series, and a column
+        per year whose name starts with the year, e.g., "2019 [YR2019]".
+    curie_by_name : dict[str, str]
+        The MeSH CURIE of geolocations by name.
+
+    Returns
+    -------
+    nodes : Iterator[tuple]
+        The indicator nodes, one per row.
+    edges : Iterator[tuple]
+        The has_indicator edges from geolocations to indicators, with the
+        numeric values of each year as a JSON string.
+    """
+    country_names = indicator_df["Country Name"].map(LOCATION_MESH_MAPPING) \
+        .fillna(indicator_df["Country Name"])
+    country_curies = country_names.map(curie_by_name)
+    indicator_df = indicator_df[country_curies.notna()]
+    country_curies = country_curies[country_curies.notna()]
+
+    # Values that aren't numeric, e.g., ".." for missing data, are dropped
+    id_columns = ["Country Name", "Country Code", "Series Name", "Series Code"]
+    values_df = indicator_df.reset_index(drop=True).drop(
+        columns=id_columns, errors="ignore"
+    )
+    values_df.columns = [str(column)[:4] for column in values_df.columns]
+    values_df = values_df.apply(pd.to_numeric, errors="coerce").round(3)
+    long_df = values_df.reset_index().melt(id_vars="index", var_name="year")
+    long_df = long_df.dropna(subset=["value"]).sort_values("index",
+                                                           kind="stable")
+
+    # Aggregate the values of each row into its years_data JSON, formatted
+    # the way json.dumps formats a dict of years to floats
+    items = [f'"{year}": {value!r}' for year, value in
+             zip(long_df["year"].tolist(), long_df["value"].tolist())]
+    row_indices = long_df["index"].to_numpy()
+    # Rows without any numeric values keep an empty years_data
+    years_data = ["{}"] * len(indicator_df)
+    if len(row_indices):
+        starts = np.flatnonzero(
+            np.r_[True, row_indices[1:] != row_indices[:-1]]
         )
-    with open(os.path.join(HERE, "indicator_dev_nodes.tsv"), "w") as fh:
-        writer = csv.writer(fh, delimiter="\t")
-        writer.writerows([node_header] + sorted(list(dev_nodes)))
-    with open(os.path.join(HERE, "indicator_dev_edges.tsv"), "w") as fh:
-        writer = csv.writer(fh, delimiter="\t")
-        writer.writerows([edge_header] + sorted(list(dev_edges)))
-
-
-def add_geoname_nodes_edges():
+        ends = np.r_[starts[1:], len(items)]
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            years_data[row_indices[start]] = \
+                "{" + ", ".join(items[start:end]) + "}"
+
+    indicator_curies = "wdi:" + indicator_df["Series Code"].astype(str)
+    nodes = zip(indicator_curies, indicator_df["Series Name"],
+                ["indicator"] * len(indicator_df))
+    edges = zip(country_curies, years_data,
+                ["has_indicator"] * len(indicator_df), indicator_curies)
+    return nodes, edges
+
+
+def add_geoname_nodes_edges(n_workers=None):
+    """Assemble geonames nodes and edges for locations not in MeSH.
+
+    Parameters
+    ----------
+    n_workers : int
+        The number of processes to ground geonames terms with, by default
+        the number of CPUs.
+    """
     from mira.dkg.resources.geonames import get_geonames_terms
     from pyobo.struct import part_of
 
-    nodes, edges = set(), set()
     node_header = ["curie:ID", "name:string", ":LABEL"]
     edge_header = [":START_ID", ":TYPE", ":END_ID"]
     geoname_terms = get_geonames_terms()
-    mesh_node_df = pd.read_csv("../kg/mesh_hierarchy_nodes.tsv", sep="\t")
-    for geoname_term in geoname_terms:
-        # If the geoname term can be mapped to a MESH term, don't add it as a geoname node
-        if not convert_geoname_to_mesh(mesh_node_df, geoname_term).empty:
-            continue
-        nodes.add((geoname_term.curie, geoname_term.name, "geoloc"))
-        for parent_geoname_term in geoname_term.get_relationships(part_of):
-            # We only add a geoname node as a target if the geolocation it
-            # represents isn't present as a MESH term
-            mesh_parent_info = convert_geoname_to_mesh(
-                mesh_node_df, parent_geoname_term
-            )
-            if not mesh_parent_info.empty:
-                parent_curie = mesh_parent_info.values[0][0]
+    parents_by_curie = {
+        geoname_term.curie: geoname_term.get_relationships(part_of)
+        for geoname_term in geoname_terms
+    }
+    references = {geoname_term.curie: geoname_term.name
+                  for geoname_term in geoname_terms}
+    for parents in parents_by_curie.values():
+        for parent in parents:
+            references.setdefault(parent.curie, parent.name)
+    mesh_node_df = read_table(os.path.join(HERE, "mesh_hierarchy_nodes.tsv"),
+                              columns=["curie:ID", "name:string", ":LABEL"])
+    crosswalk = get_geoname_mesh_crosswalk(references, mesh_node_df,
+                                           n_workers=n_workers)
+
+    with TsvSink(os.path.join(HERE, "geoname_nodes.tsv"), node_header) as nodes, \
+            TsvSink(os.path.join(HERE, "geoname_edges.tsv"), edge_header) as edges:
+        for geoname_term in geoname_terms:
+            # If the geoname term can be mapped to a MESH term, don't add it as a geoname node
+            if crosswalk[geoname_term.curie]:
+                continue
+            nodes.add((geoname_term.curie, geoname_term.name, "geoloc"))
+            for parent_geoname_term in parents_by_curie[geoname_term.curie]:
+                # We only add a geoname node as a target if the geolocation it
+                # represents isn't present as a MESH term
+                parent_curie = crosswalk[parent_geoname_term.curie] or \
+                    parent_geoname_term.curie
                 edges.add((geoname_term.curie, "isa", parent_curie))
-            else:
-                edges.add((geoname_term.curie, "isa", parent_geoname_term.curie))
-    with open(os.path.join(HERE, "geoname_nodes.tsv"), "w") as fh:
-        writer = csv.writer(fh, delimiter="\t")
-        writer.writerows([node_header] + sorted(list(nodes)))
-    with open(os.path.join(HERE, "geoname_edges.tsv"), "w") as fh:
-        writer = csv.writer(fh, delimiter="\t")
-        writer.writerows([edge_header] + sorted(list(edges)))
 
 
-def convert_geoname_to_mesh(mesh_node_df, geoname_term):
-    """
-    Helper method to ground a geoname term to its corresponding MESH term
-    equivalent and return the MESH term if applicable.
-    """
-    name = geoname_term.name
-    if name in LOCATION_MESH_MAPPING:
-        name = LOCATION_MESH_MAPPING[name]
-    gilda_match_list = grounder.ground(name, namespaces=["MESH"])
-    grounded_mesh_curie = None
+def ground_geoname(text):
+    """Return the MeSH CURIE that gilda grounds a location name to, if any."""
+    gilda_match_list = get_grounder().ground(text, namespaces=["MESH"])
     if gilda_match_list:
         gilda_term = gilda_match_list[0].term
         if gilda_term.source == "mesh":
-            grounded_mesh_curie = f"{gilda_term.db}:{gilda_term.id}"
-    # If the geoname can't be grounded to a MESH term, try basic name-space
-    # filtering for MESH nodes
-    if grounded_mesh_curie:
-        mesh_term_info = mesh_node_df[mesh_node_df["curie:ID"] == grounded_mesh_curie]
-    else:
-        mesh_term_info = mesh_node_df[
-            (mesh_node_df["curie:ID"] == "geoloc")
-            & (mesh_node_df["name:string"] == name)
-        ]
-    return mesh_term_info
+            return f"{gilda_term.db}:{gilda_term.id}"
+    return None
+
+
+def get_geoname_mesh_crosswalk(references, mesh_node_df, n_workers=None,
+                               path=GEONAME_GROUNDINGS):
+    """Return the MeSH CURIE of each geonames term that has one.
+
+    Each distinct name is grounded once, in a pool of processes. The
+    groundings are saved as returned by gilda so that later builds only
+    ground names they haven't seen before, and are resolved against the
+    MeSH nodes of the current build.
+
+    Parameters
+    ----------
+    references : dict[str, str]
+        The name of geonames terms by CURIE.
+    mesh_node_df : pandas.DataFrame
+        The MeSH nodes of the graph.
+    n_workers : int
+        The number of processes to ground names with, by default the
+        number of CPUs.
+    path : str
+        The path to the TSV file of groundings.
+
+    Returns
+    -------
+    dict[str, str]
+        The MeSH CURIE of each geonames CURIE, or an empty string if the
+        term isn't grounded to a MeSH node of the graph.
+    """
+    grounding_by_text = {}
+    if path and os.path.exists(path):
+        with open(path, "r") as fh:
+            for text, mesh_curie in list(csv.reader(fh, delimiter="\t"))[1:]:
+                grounding_by_text[text] = mesh_curie or None
+
+    # Some names are grounded through a manual mapping to a MeSH name
+    text_by_name = {name: LOCATION_MESH_MAPPING.get(name, name)
+                    for name in set(references.values())}
+    texts = sorted(set(text_by_name.values()) - set(grounding_by_text))
+    if texts:
+        # The grounder is loaded before the pool forks so workers share it
+        get_grounder()
+        n_workers = n_workers or os.cpu_count()
+        chunksize = max(1, len(texts) // (4 * n_workers))
+        with ProcessPoolExecutor(n_workers) as pool:
+            groundings = list(tqdm.tqdm(
+                pool.map(ground_geoname, texts, chunksize=chunksize),
+                total=len(texts), desc="Grounding geonames"
+            ))
+        grounding_by_text.update(zip(texts, groundings))
+        if path:
+            write_tsv(path, ["text:string", "mesh:ID"],
+                      ((text, mesh_curie or "")
+                       for text, mesh_curie in grounding_by_text.items()))
+
+    mesh_curies = set(mesh_node_df["curie:ID"])
+    geoloc_df = mesh_node_df[mesh_node_df[":LABEL"].str.contains("geoloc")] \
+        .drop_duplicates("name:string")
+    geoloc_curie_by_name = dict(zip(geoloc_df["name:string"],
+                                    geoloc_df["curie:ID"]))
+    mesh_curie_by_name = {}
+    for name, text in text_by_name.items():
+        grounded_mesh_curie = grounding_by_text[text]
+        # If the geoname can't be grounded to a MESH term, try matching
+        # its name to MESH geolocation nodes
+        if grounded_mesh_curie:
+            mesh_curie_by_name[name] = grounded_mesh_curie \
+                if grounded_mesh_curie in mesh_curies else ""
+        else:
+            mesh_curie_by_name[name] = geoloc_curie_by_name.get(text, "")
+    return {curie: mesh_curie_by_name[name]
+            for curie, name in references.items()}
+
+
+def assemble_hierarchy_closure():
+    """Write the ancestors of terms as edges so queries don't expand paths.
+
+    Each disease, pathogen and geolocation has an isa_closure edge to
+    itself and to each term it reaches by isa edges, which replaces
+    [:isa*0..] in queries. Terms also have a phenotype_closure edge to
+    each term they reach by has_phenotype and isa edges, using at least
+    one has_phenotype edge, which together with isa_closure replaces
+    [:has_phenotype|isa*0..].
+    """
+    edge_header = [':START_ID', ':TYPE', ':END_ID']
+    curies = pd.concat([
+        read_table(os.path.join(HERE, fname), columns=['curie:ID'])['curie:ID']
+        for fname in ('mesh_hierarchy_nodes.tsv', 'geoname_nodes.tsv')
+    ])
+    isa_df = pd.concat([
+        read_table(os.path.join(HERE, fname))
+        for fname in ('mesh_hierarchy_edges.tsv', 'geoname_edges.tsv')
+    ])
+    isa_df = isa_df[isa_df[':TYPE'] == 'isa']
+    phenotype_df = read_table(os.path.join(HERE,
+                                           'disease_phenotype_edges.tsv'))
+    index = pd.Index(pd.concat([
+        curies, isa_df[':START_ID'], isa_df[':END_ID'],
+        phenotype_df[':START_ID'], phenotype_df[':END_ID'],
+    ]).unique())
+
+    def get_adjacency(*edge_dfs):
+        starts = index.get_indexer(pd.concat([df[':START_ID']
+                                              for df in edge_dfs]))
+        ends = index.get_indexer(pd.concat([df[':END_ID']
+                                            for df in edge_dfs]))
+        adjacency = csr_matrix((np.ones(len(starts), dtype=np.int32),
+                                (starts, ends)),
+                               shape=(len(index), len(index)))
+        adjacency.data[:] = 1
+        return adjacency
+
+    isa_closure = get_transitive_closure(get_adjacency(isa_df))
+    phenotype_closure = get_transitive_closure(
+        get_adjacency(isa_df, phenotype_df))
+    phenotype_closure = phenotype_closure - \
+        phenotype_closure.multiply(isa_closure)
+    phenotype_closure.eliminate_zeros()
+    for rel_type, closure in (('isa_closure', isa_closure),
+                              ('phenotype_closure', phenotype_closure)):
+        closure = closure.tocoo()
+        write_tsv(os.path.join(HERE, f'{rel_type}_edges.tsv'), edge_header,
+                  zip(index[closure.row], [rel_type] * closure.nnz,
+                      index[closure.col]))
+
+
+def get_transitive_closure(adjacency):
+    """Return the reflexive transitive closure of a graph.
+
+    Parameters
+    ----------
+    adjacency : scipy.sparse.csr_matrix
+        The adjacency matrix of the graph, with 1 for each edge.
+
+    Returns
+    -------
+    scipy.sparse.csr_matrix
+        A matrix with 1 for each pair of nodes where the second is
+        reachable from the first, including each node with itself.
+    """
+    closure = identity(adjacency.shape[0], dtype=np.int32, format='csr')
+    # Extend only the pairs found in the last step until no new pairs are
+    # found, which also ends on cycles
+    frontier = closure
+    while frontier.nnz:
+        reached = frontier @ adjacency
+        reached.data[:] = 1
+        frontier = reached - reached.multiply(closure)
+        frontier.eliminate_zeros()
+        closure = closure + frontier
+    return closure
+
+
+def assemble_mesh_type_index():
+    MeshTypeIndex.build().save(MESH_TYPE_INDEX)
+
+
+def get_stages():
+    """Return the build stages with the files they read and write."""
+    def here(*fnames):
+        return [os.path.join(HERE, fname) for fname in fnames]
+
+    # MeSH terms, tree numbers and xrefs come from resource files of INDRA
+    mesh_resources = sorted(glob.glob(
+        os.path.join(os.path.dirname(indra.resources.__file__), 'mesh*')))
+    terms_by_alert = os.path.join(NER_OUTPUT, 'promed_ner_terms_by_alert.json')
+    outbreaks = os.path.join(NER_OUTPUT, 'promed_outbreaks.csv')
+    indicator_inputs = here(*(fname for _, fname in INDICATOR_FILES))
+    indicator_outputs = here(*(f'indicator_{name}_{kind}.tsv'
+                               for name, _ in INDICATOR_FILES
+                               for kind in ('nodes', 'edges')))
+    stages = [
+        Stage('mesh_type_index', assemble_mesh_type_index,
+              inputs=mesh_resources,
+              outputs=[MESH_TYPE_INDEX]),
+        Stage('outbreak_nodes', assemble_outbreak_nodes,
+              inputs=[outbreaks],
+              outputs=here('promed_outbreak_nodes.tsv',
+                           'promed_alert_outbreak_edges.tsv')),
+        Stage('alert_relations', assemble_alert_relations,
+              inputs=[terms_by_alert, outbreaks, MESH_TYPE_INDEX],
+              outputs=here('promed_alert_nodes.tsv',
+                           'promed_alert_edges.tsv')),
+        Stage('mesh_hierarchy', assemble_mesh_hierarchy,
+              inputs=[MESH_TYPE_INDEX] + mesh_resources,
+              outputs=here('mesh_hierarchy_nodes.tsv',
+                           'mesh_hierarchy_edges.tsv')),
+        Stage('pathogen_disease_relations',
+              assemble_pathogen_disease_relations,
+              inputs=here('pathogen_disease_rels.tsv') + mesh_resources,
+              outputs=here('pathogen_disease_edges.tsv')),
+        Stage('disease_symptom_relations', assemble_disease_symptom_relations,
+              inputs=here('disease_phenotype_rels.tsv') + mesh_resources,
+              outputs=here('disease_phenotype_edges.tsv')),
+        Stage('world_indicator_data', assemble_world_indicator_data,
+              inputs=here('mesh_hierarchy_nodes.tsv') + indicator_inputs,
+              outputs=indicator_outputs),
+        Stage('geoname_nodes_edges', add_geoname_nodes_edges,
+              inputs=here('mesh_hierarchy_nodes.tsv'),
+              outputs=here('geoname_nodes.tsv', 'geoname_edges.tsv') +
+              [GEONAME_GROUNDINGS]),
+        Stage('hierarchy_closure', assemble_hierarchy_closure,
+              inputs=here('mesh_hierarchy_nodes.tsv',
+                          'mesh_hierarchy_edges.tsv', 'geoname_nodes.tsv',
+                          'geoname_edges.tsv', 'disease_phenotype_edges.tsv'),
+              outputs=here('isa_closure_edges.tsv',
+                           'phenotype_closure_edges.tsv')),
+    ]
+    # Stages without the Parquet copies of their outputs need to run again
+    if parquet_output_enabled():
+        for stage in stages:
+            stage.outputs += [get_parquet_path(path) for path in stage.outputs
+                              if path.endswith('.tsv')]
+    return stages
+
 
 if __name__ == "__main__":
-    assemble_outbreak_nodes()
-    assemble_alert_relations()
-    assemble_mesh_hierarchy()
-    assemble_pathogen_disease_relations()
-    assemble_disease_symptom_relations()
-    assemble_world_indicator_data()
-    add_geoname_nodes_edges()
+    parser = argparse.ArgumentParser(
+        description="Assemble the node and edge files of the graph."
+    )
+    parser.add_argument("--workers", type=int,
+                        help="The number of stages to run at the same time")
+    parser.add_argument("--force", action="store_true",
+                        help="Run stages even if they are up to date")
+    parser.add_argument("--only", nargs="+",
+                        help="The names of the stages to run")
+    parser.add_argument("--parquet", action="store_true",
+                        help="Also write Parquet copies of the TSV files")
+    args = parser.parse_args()
+    if args.parquet:
+        os.environ["KG_OUTPUT_FORMAT"] = "parquet"
+    report = run_pipeline(get_stages(), n_workers=args.workers,
+                          force=args.force, only=args.only)
+    if any(stage["status"] == "failed" for stage in report.values()):
+        raise SystemExit(1)
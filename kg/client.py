@@ -1,119 +1,290 @@
+import os
 import json
+import time
+import base64
+import asyncio
+import binascii
+import inspect
+import logging
+import threading
 from pathlib import Path
 from collections import defaultdict
-from typing import Any, List, Optional
+from typing import Any, AsyncIterator, Iterator, List, Optional
 from typing_extensions import TypeAlias
 
 import gilda
 import neo4j
-from neo4j import GraphDatabase, Transaction, unit_of_work
-from indra.databases import mesh_client
-from mesh_csr import get_pubmed_meta, get_pvalues
+from neo4j import (AsyncGraphDatabase, AsyncTransaction, GraphDatabase,
+                   Transaction, unit_of_work)
+from columnar import read_table
+from mesh_csr import exclude_list, get_pubmed_meta, get_pvalues
+from literature_cache import LiteratureCache
 from realism_score import get_coocurrence_score
+from util import is_disease, is_geoloc, is_pathogen
 
-__all__ = ["Neo4jClient"]
-
-TxResult: TypeAlias = Optional[List[List[Any]]]
+__all__ = ["BaseNeo4jClient", "Neo4jClient", "AsyncNeo4jClient"]
 
+logger = logging.getLogger(__name__)
 
-def is_geoloc(x_db, x_id):
-    if x_db == 'MESH':
-        return mesh_client.mesh_isa(x_id, 'D005842')
-    return False
+TxResult: TypeAlias = Optional[List[List[Any]]]
 
+#: The number of alerts in a page of results if not given
+DEFAULT_PAGE_SIZE = 100
 
-def is_pathogen(x_db, x_id):
-    if x_db == 'MESH':
-        return mesh_client.mesh_isa(x_id, 'D001419') or \
-            mesh_client.mesh_isa(x_id, 'D014780')
-    return False
 
+PARENT_DIRECTORY = Path(__file__).parent.resolve()
 
-def is_disease(x_db, x_id):
-    if x_db == 'MESH':
-        return mesh_client.is_disease(x_id)
-    return False
 
+class PoolMetrics:
+    """Counts of the connections in a driver's pool and of acquisition waits.
 
-PARENT_DIRECTORY = Path(__file__).parent.resolve()
+    The driver doesn't expose pool metrics, so connections are counted from
+    its pool's connection table and acquisitions are timed by wrapping the
+    acquire method of its pool. These are internals of the 5.x driver, and
+    if a driver doesn't have them, a warning is logged once and the metrics
+    depending on them are None.
+    """
 
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._warned = set()
+        self._instrumented = False
+        self.acquisitions = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    def _warn_missing(self, internal: str) -> None:
+        if internal not in self._warned:
+            self._warned.add(internal)
+            logger.warning("The Neo4j driver has no %s, pool metrics that "
+                           "depend on it aren't available", internal)
+
+    def record(self, wait_time: float) -> None:
+        with self._lock:
+            self.acquisitions += 1
+            self.wait_time_total += wait_time
+            self.wait_time_max = max(self.wait_time_max, wait_time)
+
+    def instrument(self, driver) -> None:
+        """Time how long sessions of a driver wait to acquire connections."""
+        pool = getattr(driver, "_pool", None)
+        acquire = getattr(pool, "acquire", None)
+        if acquire is None:
+            self._warn_missing("_pool.acquire")
+            return
+
+        if inspect.iscoroutinefunction(acquire):
+            async def timed_acquire(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await acquire(*args, **kwargs)
+                finally:
+                    self.record(time.perf_counter() - start)
+        else:
+            def timed_acquire(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return acquire(*args, **kwargs)
+                finally:
+                    self.record(time.perf_counter() - start)
+
+        pool.acquire = timed_acquire
+        self._instrumented = True
+
+    def report(self, driver, max_pool_size: int,
+               acquisition_timeout: float) -> dict:
+        """Return the state of a driver's pool and its acquisition waits.
 
-class Neo4jClient:
-    """A client to Neo4j."""
+        Returns
+        -------
+        :
+            The maximum size of the pool, the number of connections in use
+            and idle, and the number of connection acquisitions with their
+            total, mean and maximum wait time in seconds. Metrics that the
+            driver's internals don't provide are None.
+        """
+        in_use = idle = None
+        pool_connections = getattr(getattr(driver, "_pool", None),
+                                   "connections", None)
+        if pool_connections is None:
+            self._warn_missing("_pool.connections")
+        else:
+            connections = [connection
+                           for address_connections
+                           in list(pool_connections.values())
+                           for connection in list(address_connections)]
+            if all(hasattr(connection, "in_use")
+                   for connection in connections):
+                in_use = sum(connection.in_use for connection in connections)
+                idle = len(connections) - in_use
+            else:
+                self._warn_missing("in_use flag on connections")
+        with self._lock:
+            acquisitions = self.acquisitions
+            wait_time_total = self.wait_time_total
+            wait_time_max = self.wait_time_max
+        report = {
+            "max_pool_size": max_pool_size,
+            "acquisition_timeout": acquisition_timeout,
+            "in_use": in_use,
+            "idle": idle,
+            "acquisitions": acquisitions,
+            "wait_time_total": wait_time_total,
+            "wait_time_mean": wait_time_total / acquisitions
+            if acquisitions else 0.0,
+            "wait_time_max": wait_time_max,
+        }
+        if not self._instrumented:
+            for key in ("acquisitions", "wait_time_total", "wait_time_mean",
+                        "wait_time_max"):
+                report[key] = None
+        return report
+
+
+class BaseNeo4jClient:
+    """The connection settings and driver shared by the Neo4j clients.
+
+    Subclasses set the driver factory and define their own query methods,
+    blocking ones in Neo4jClient and coroutines in AsyncNeo4jClient.
+    Connection settings that aren't given are read from the environment:
+    NEO4J_URL, NEO4J_USER, NEO4J_PASSWORD, NEO4J_MAX_POOL_SIZE,
+    NEO4J_ACQUISITION_TIMEOUT and NEO4J_FETCH_SIZE.
+
+    Parameters
+    ----------
+    url :
+        The bolt URL of the database.
+    user :
+        The user name, if the database requires authentication.
+    password :
+        The password, if the database requires authentication.
+    max_connection_pool_size :
+        The maximum number of connections the driver keeps open.
+    connection_acquisition_timeout :
+        The number of seconds to wait for a connection from the pool.
+    fetch_size :
+        The number of records to fetch at a time from the database.
+    """
 
-    _session: Optional[neo4j.Session]
+    #: The driver factory, GraphDatabase or AsyncGraphDatabase
+    graph_database = None
 
     def __init__(
         self,
+        url: Optional[str] = None,
+        user: Optional[str] = None,
+        password: Optional[str] = None,
+        max_connection_pool_size: Optional[int] = None,
+        connection_acquisition_timeout: Optional[float] = None,
+        fetch_size: Optional[int] = None,
     ) -> None:
-        """Initialize the Neo4j client."""
+        """Initialize the driver of the client."""
         # We initialize this so that the del doesn't error if some
         # exception occurs before it's initialized
         self.driver = None
-        url = "bolt://localhost:7687"
-        user = None
-        password = None
+        url = url or os.environ.get("NEO4J_URL", "bolt://localhost:7687")
+        user = user or os.environ.get("NEO4J_USER")
+        password = password or os.environ.get("NEO4J_PASSWORD")
+        self.max_connection_pool_size = max_connection_pool_size or \
+            int(os.environ.get("NEO4J_MAX_POOL_SIZE", 100))
+        self.connection_acquisition_timeout = \
+            connection_acquisition_timeout or \
+            float(os.environ.get("NEO4J_ACQUISITION_TIMEOUT", 60))
+        self.fetch_size = fetch_size or \
+            int(os.environ.get("NEO4J_FETCH_SIZE", 1000))
 
         # Set max_connection_lifetime to something smaller than the timeouts
         # on the server or on the way to the server. See
         # https://github.com/neo4j/neo4j-python-driver/issues/316#issuecomment-564020680
-        self.driver = GraphDatabase.driver(
+        self.driver = self.graph_database.driver(
             url,
             auth=(user, password) if user and password else None,
             max_connection_lifetime=3 * 60,
+            max_connection_pool_size=self.max_connection_pool_size,
+            connection_acquisition_timeout=self.connection_acquisition_timeout,
         )
-        self._session = None
+        self._pool_metrics = PoolMetrics()
+        self._pool_metrics.instrument(self.driver)
+        self._has_closure = None
+
+    def pool_metrics(self) -> dict:
+        """Return the state of the connection pool and acquisition waits.
+
+        Returns
+        -------
+        :
+            The maximum size of the pool, the number of connections in use
+            and idle, and the number of connection acquisitions with their
+            total, mean and maximum wait time in seconds.
+        """
+        return self._pool_metrics.report(self.driver,
+                                         self.max_connection_pool_size,
+                                         self.connection_acquisition_timeout)
+
+
+class Neo4jClient(BaseNeo4jClient):
+    """A client to Neo4j.
+
+    Each thread reuses its own session. See BaseNeo4jClient for the
+    connection settings.
+    """
+
+    graph_database = GraphDatabase
+
+    def __init__(self, *args, **kwargs) -> None:
+        # Sessions aren't thread safe, so each thread reuses its own
+        self._local = threading.local()
+        super().__init__(*args, **kwargs)
 
     def __del__(self):
         if self.driver is not None:
             self.driver.close()
 
+    def get_session(self) -> neo4j.Session:
+        """Return the session of the current thread, opening it if needed."""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self.driver.session(fetch_size=self.fetch_size)
+            self._local.session = session
+        return session
+
+    def close_session(self) -> None:
+        """Close the session of the current thread, if it has one."""
+        session = getattr(self._local, "session", None)
+        if session is not None:
+            self._local.session = None
+            session.close()
+
+    def _run_transaction(self, write: bool, query: str,
+                         **query_params) -> TxResult:
+        session = self.get_session()
+        try:
+            if write:
+                return session.execute_write(do_cypher_tx, query,
+                                             **query_params)
+            return session.execute_read(do_cypher_tx, query, **query_params)
+        except Exception:
+            # Don't reuse a session that may be in a broken state
+            self.close_session()
+            raise
+
     def query_tx(self, query: str, **query_params) -> Optional[TxResult]:
-        with self.driver.session() as session:
-            values = session.read_transaction(do_cypher_tx, query, **query_params)
-        return values
+        return self._run_transaction(False, query, **query_params)
+
+    def has_closure(self) -> bool:
+        """Return True if the graph has precomputed isa_closure edges."""
+        if self._has_closure is None:
+            self._has_closure = bool(self.query_tx(HAS_CLOSURE_QUERY))
+        return self._has_closure
 
     def query_indicators(
         self,
         geolocation: str,
         indicator_filter: str,
     ):
-        geolocation_curie = get_curie(geolocation)
-        query = \
-        """
-        MATCH (i:indicator)<-[r:has_indicator]-(geolocation:geoloc)
-        MATCH path = (geolocation)-[r_t:isa*0..]->(geolocation_isa:geoloc {curie: $geolocation_curie})
-        WHERE i.name CONTAINS $indicator_filter
-        RETURN i, r, geolocation, nodes(path)[1..] AS geolocation_isa
-        UNION 
-        MATCH (i:indicator)<-[r:has_indicator]-(geolocation:geoloc)
-        MATCH path = (geolocation)<-[r_t:isa*0..]-(geolocation_isa:geoloc {curie: $geolocation_curie})
-        WHERE i.name CONTAINS $indicator_filter
-        RETURN i, r, geolocation, nodes(path)[1..] AS geolocation_isa
-        """
-        query_parameters = {
-            "geolocation_curie": geolocation_curie,
-            "indicator_filter": indicator_filter
-        }
-        res = self.query_tx(query, **query_parameters)
-        data = []
-        for row in res:
-            if not isinstance(row[3], list):
-                data.append({
-                    'indicator': dict(row[0]),
-                    'data': json.loads(dict(row[1])['years_data']),
-                    'geolocation': dict(row[2]),
-                    'geolocation_isa': dict(row[3]),
-                })
-            else:
-                geolocation_isa = [dict(row_ele) for row_ele in row[3]]
-                data.append({
-                    'indicator': dict(row[0]),
-                    'data': json.loads(dict(row[1])['years_data']),
-                    'geolocation': dict(row[2]),
-                    'geolocation_isa': geolocation_isa,
-                })
-        return data
+        query, query_parameters = get_indicators_query(
+            geolocation, indicator_filter, self.has_closure())
+        return get_indicator_results(self.query_tx(query, **query_parameters))
 
     def query_graph(
         self,
@@ -124,162 +295,90 @@ class Neo4jClient:
         symptom: str = None,
         limit: int = None
     ):
-        search_query = "MATCH (n:alert)-[:mentions]->(m)"
-        query_parameters = {}
-        return_value = " RETURN DISTINCT n, n.timestamp"
-        result_elements = []
-        if timestamp:
-            search_query += " WHERE n.timestamp = $timestamp"
-            query_parameters["timestamp"] = timestamp
-        if disease:
-            disease_curie = get_curie(disease)
-            if disease_curie is None:
-                return []
-            search_query += (
-                " MATCH (n:alert)-[r_d:mentions]->(disease:disease)-"
-                "[:isa*0..]->(disease_isa:disease {curie: $disease_curie})"
-            )
-            query_parameters["disease_curie"] = disease_curie
-            return_value += ", disease, disease_isa"
-            result_elements.append('disease')
-        if geolocation:
-            geolocation_curie = get_curie(geolocation)
-            if geolocation_curie is None:
-                return []
-            search_query += (
-                " MATCH (n:alert)-[r_g:mentions]->(geolocation:geoloc)-"
-                "[:isa*0..]->(geolocation_isa:geoloc {curie: $geolocation_curie})"
-            )
-            query_parameters["geolocation_curie"] = geolocation_curie
-            return_value += ", geolocation, geolocation_isa"
-            result_elements.append('geoloc')
-        if pathogen:
-            pathogen_curie = get_curie(pathogen)
-            if pathogen_curie is None:
-                return []
-            search_query += (
-                " MATCH (n:alert)-[r_p:mentions]->(pathogen:pathogen)-"
-                "[:isa*0..]->(pathogen_isa:pathogen {curie: $pathogen_curie})"
-            )
-            query_parameters["pathogen_curie"] = pathogen_curie
-            return_value += ", pathogen, pathogen_isa"
-            result_elements.append('pathogen')
-        if symptom:
-            symptom_curie = get_curie(symptom)
-            if symptom_curie is None:
-                return []
-            search_query += (
-                " MATCH (n)-[r_s:mentions]->(symptom:disease)-"
-                "[:has_phenotype|isa*0..]->(symptom_isa:disease {curie:$symptom_curie})"
-            )
-            query_parameters["symptom_curie"] = symptom_curie
-            return_value += ", symptom, symptom_isa"
-            result_elements.append('symptom')
-        search_query += return_value
-        if limit:
-            search_query += f" LIMIT {limit}"
+        alerts_query = get_alerts_query(disease, geolocation, pathogen,
+                                        timestamp, symptom, limit,
+                                        self.has_closure())
+        if alerts_query is None:
+            return []
+        search_query, query_parameters, result_elements = alerts_query
         res = self.query_tx(search_query, **query_parameters)
-        all_data = []
-        for row in res:
-            alert = dict(row[0])
-            alert['timestamp'] = row[1]
-            data = {'alert': alert}
-            for idx, element in enumerate(result_elements):
-                # First element is the given entity, the next is any isa entity
-                i = idx * 2 + 2
-                data[element] = dict(row[i])
-                data[element + '_isa'] = dict(row[i + 1])
-            all_data.append(data)
-        return all_data
+        return get_alert_results(res, result_elements)
 
-    def annotate_text_query(self, text: str):
-        data = {}
-        annotations = gilda.annotate(text, namespaces=['MESH', 'geonames'])
-        def get_type(db, id):
-            if is_disease(db, id):
-                return 'disease'
-            elif is_geoloc(db, id):
-                return 'geoloc'
-            elif is_pathogen(db, id):
-                return 'pathogen'
-            else:
-                return 'other'
-
-        data['annotations'] = [
-            {
-                'text': a.text,
-                'name': a.matches[0].term.entry_name,
-                'curie': f'{a.matches[0].term.db}:{a.matches[0].term.id}',
-                'type': get_type(a.matches[0].term.db, a.matches[0].term.id),
-            }
-            for a in annotations
-        ]
-        curies = sorted({a['curie'] for a in data['annotations']})
-        print('Looking up CURIEs:', ', '.join(curies))
-        # Query for direct relationships between the terms
-        # TODO: we should add an entity tag to all of the
-        # domain-specific terms to make these queries scale
-        query = """
-            MATCH (a:entity)-[r]->(b:entity)
-            WHERE a.curie IN $curies AND b.curie IN $curies
-            RETURN a, r, b
+    def query_alerts_page(
+        self,
+        disease: str = None,
+        geolocation: str = None,
+        pathogen: str = None,
+        timestamp: str = None,
+        symptom: str = None,
+        page_size: int = DEFAULT_PAGE_SIZE,
+        cursor: Optional[str] = None,
+    ):
+        """Return a page of the alerts mentioning the given entities.
+
+        Alerts are ordered by timestamp and CURIE.
+
+        Parameters
+        ----------
+        page_size :
+            The maximum number of results in the page.
+        cursor :
+            The token returned with the previous page, if any.
+
+        Returns
+        -------
+        :
+            The results in the page and the token of the next page, which
+            is None if there are no more results.
         """
-        res_direct = self.query_tx(query, curies=curies)
-        data['direct'] = []
-        for res in res_direct:
-            a, r, b = res
-            entry = {
-                'a': dict(a),
-                'b': dict(b),
-                'r': dict(r)
-            }
-            data['direct'].append(entry)
-        # Query for alerts in which these co-occur in any pairs
-        query = """
-            MATCH (n:alert)-[:mentions]->(a)
-            MATCH (n:alert)-[:mentions]->(b)
-            WHERE a.curie IN $curies AND b.curie IN $curies
-            AND a <> b
-            RETURN n, a, b
+        cursor = decode_cursor(cursor) if cursor else None
+        alerts_query = get_alerts_query(disease, geolocation, pathogen,
+                                        timestamp, symptom, page_size,
+                                        self.has_closure(), cursor,
+                                        ordered=True)
+        if alerts_query is None:
+            return [], None
+        search_query, query_parameters, result_elements = alerts_query
+        res = self.query_tx(search_query, **query_parameters)
+        return get_alert_results(res, result_elements), \
+            get_next_cursor(res, page_size)
+
+    def stream_alerts(
+        self,
+        disease: str = None,
+        geolocation: str = None,
+        pathogen: str = None,
+        timestamp: str = None,
+        symptom: str = None,
+        limit: int = None
+    ) -> Iterator[dict]:
+        """Yield the alerts mentioning the given entities as they arrive.
+
+        Records are fetched from the database in batches of fetch_size in a
+        session of their own, so that results don't have to fit in memory.
         """
-        res_alerts = self.query_tx(query, curies=curies)
-        # We reorganize alerts so that we can merge all entities
-        # appearing in them into a single alert entry
-        entities_by_curie = {}
-        entities_by_alert = defaultdict(set)
-        alerts_by_name = {}
-        for res in res_alerts:
-            alert = dict(res[0])
-            a = dict(res[1])
-            b = dict(res[2])
-            entities_by_alert[alert['name']] |= {a['curie'], b['curie']}
-            entities_by_curie[a['curie']] = a
-            entities_by_curie[b['curie']] = b
-            alerts_by_name[alert['name']] = alert
-        sorted_alerts = sorted(alerts_by_name.items(), key=lambda x: len(entities_by_alert[x[0]]),
-                               reverse=True)
-        top_alerts = sorted_alerts[:500]
-        # We now generate the actual alert entries
-        data['alerts'] = []
-        for alert_id, alert in top_alerts:
-            entities = [entities_by_curie[entity]
-                        for entity in entities_by_alert[alert_id]]
-            data['alerts'].append({'alert': alert, 'entities': entities})
-
-        mesh_ids = [c.lstrip('MESH:') for c in curies
-                    if c.startswith('MESH:')]
-        scores, score_sum = get_coocurrence_score(mesh_ids)
-        scores = [
-            [m1, m2, s] for (m1, m2), s in scores.items()
-        ]
-        classification = 'high' if score_sum > -4.5 else \
-            'medium' if score_sum > -7 else 'low'
-        data['realism_score'] = {
-            'scores': scores,
-            'score_sum': score_sum,
-            'classification': classification
-        }
+        alerts_query = get_alerts_query(disease, geolocation, pathogen,
+                                        timestamp, symptom, limit,
+                                        self.has_closure())
+        if alerts_query is None:
+            return
+        search_query, query_parameters, result_elements = alerts_query
+        with self.driver.session(fetch_size=self.fetch_size,
+                                 default_access_mode=neo4j.READ_ACCESS) \
+                as session:
+            for record in session.run(search_query,
+                                      parameters=query_parameters):
+                yield get_alert_result(record.values(), result_elements)
 
+    def annotate_text_query(self, text: str):
+        data = {'annotations': get_text_annotations(text)}
+        curies = sorted({a['curie'] for a in data['annotations']})
+        logger.debug('Looking up CURIEs: %s', ', '.join(curies))
+        res_direct = self.query_tx(DIRECT_RELATIONS_QUERY, curies=curies)
+        data['direct'] = get_direct_relations(res_direct)
+        res_alerts = self.query_tx(COOCCURRING_ALERTS_QUERY, curies=curies)
+        data['alerts'] = get_cooccurring_alerts(res_alerts)
+        data['realism_score'] = get_realism_score(curies)
         return data
 
     def read_query(self, query: str, **query_params) -> List[List]:
@@ -297,20 +396,543 @@ class Neo4jClient:
         :
             The result of the query
         """
-        with self.driver.session() as session:
-            values = session.read_transaction(do_cypher_tx, query, **query_params)
+        return self._run_transaction(False, query, **query_params)
 
-        return values
+    def write_tx(self, query: str, **query_params) -> Optional[TxResult]:
+        """Run a write query in a transaction
+
+        Parameters
+        ----------
+        query :
+            The cypher query to run
+        query_params :
+            The parameters to pass to the query
+
+        Returns
+        -------
+        :
+            The result of the query
+        """
+        return self._run_transaction(True, query, **query_params)
 
     def read_dict(self, query, **query_params):
         """Run a read-only query that returns a 2-tuple and put it in a dict."""
         return dict(self.read_query(query, **query_params))
 
 
+class AsyncNeo4jClient(BaseNeo4jClient):
+    """A client to Neo4j using the async driver.
+
+    Its query methods are coroutines with the same arguments and results as
+    those of Neo4jClient, so that concurrent queries overlap in one event
+    loop. Grounding and scoring, which don't involve the database, run in a
+    thread. Each transaction runs in its own session, since sessions can't
+    be shared between concurrent tasks. The driver has to be closed with
+    close. See BaseNeo4jClient for the connection settings.
+    """
+
+    graph_database = AsyncGraphDatabase
+
+    async def close(self) -> None:
+        """Close the driver and its connections."""
+        if self.driver is not None:
+            await self.driver.close()
+            self.driver = None
+
+    def get_session(self) -> neo4j.AsyncSession:
+        """Return a new session."""
+        return self.driver.session(fetch_size=self.fetch_size)
+
+    async def _run_transaction(self, write: bool, query: str,
+                               **query_params) -> TxResult:
+        async with self.get_session() as session:
+            if write:
+                return await session.execute_write(
+                    do_async_cypher_tx, query, **query_params)
+            return await session.execute_read(
+                do_async_cypher_tx, query, **query_params)
+
+    async def query_tx(self, query: str,
+                       **query_params) -> Optional[TxResult]:
+        return await self._run_transaction(False, query, **query_params)
+
+    async def has_closure(self) -> bool:
+        """Return True if the graph has precomputed isa_closure edges."""
+        if self._has_closure is None:
+            self._has_closure = bool(await self.query_tx(HAS_CLOSURE_QUERY))
+        return self._has_closure
+
+    async def query_indicators(
+        self,
+        geolocation: str,
+        indicator_filter: str,
+    ):
+        use_closure = await self.has_closure()
+        query, query_parameters = await asyncio.to_thread(
+            get_indicators_query, geolocation, indicator_filter, use_closure)
+        res = await self.query_tx(query, **query_parameters)
+        return get_indicator_results(res)
+
+    async def query_graph(
+        self,
+        disease: str = None,
+        geolocation: str = None,
+        pathogen: str = None,
+        timestamp: str = None,
+        symptom: str = None,
+        limit: int = None
+    ):
+        use_closure = await self.has_closure()
+        alerts_query = await asyncio.to_thread(
+            get_alerts_query, disease, geolocation, pathogen, timestamp,
+            symptom, limit, use_closure)
+        if alerts_query is None:
+            return []
+        search_query, query_parameters, result_elements = alerts_query
+        res = await self.query_tx(search_query, **query_parameters)
+        return get_alert_results(res, result_elements)
+
+    async def query_alerts_page(
+        self,
+        disease: str = None,
+        geolocation: str = None,
+        pathogen: str = None,
+        timestamp: str = None,
+        symptom: str = None,
+        page_size: int = DEFAULT_PAGE_SIZE,
+        cursor: Optional[str] = None,
+    ):
+        cursor = decode_cursor(cursor) if cursor else None
+        use_closure = await self.has_closure()
+        alerts_query = await asyncio.to_thread(
+            get_alerts_query, disease, geolocation, pathogen, timestamp,
+            symptom, page_size, use_closure, cursor, True)
+        if alerts_query is None:
+            return [], None
+        search_query, query_parameters, result_elements = alerts_query
+        res = await self.query_tx(search_query, **query_parameters)
+        return get_alert_results(res, result_elements), \
+            get_next_cursor(res, page_size)
+
+    async def stream_alerts(
+        self,
+        disease: str = None,
+        geolocation: str = None,
+        pathogen: str = None,
+        timestamp: str = None,
+        symptom: str = None,
+        limit: int = None
+    ) -> AsyncIterator[dict]:
+        use_closure = await self.has_closure()
+        alerts_query = await asyncio.to_thread(
+            get_alerts_query, disease, geolocation, pathogen, timestamp,
+            symptom, limit, use_closure)
+        if alerts_query is None:
+            return
+        search_query, query_parameters, result_elements = alerts_query
+        async with self.driver.session(
+                fetch_size=self.fetch_size,
+                default_access_mode=neo4j.READ_ACCESS) as session:
+            result = await session.run(search_query,
+                                       parameters=query_parameters)
+            async for record in result:
+                yield get_alert_result(record.values(), result_elements)
+
+    async def annotate_text_query(self, text: str):
+        annotations = await asyncio.to_thread(get_text_annotations, text)
+        data = {'annotations': annotations}
+        curies = sorted({a['curie'] for a in data['annotations']})
+        logger.debug('Looking up CURIEs: %s', ', '.join(curies))
+        res_direct, res_alerts, realism_score = await asyncio.gather(
+            self.query_tx(DIRECT_RELATIONS_QUERY, curies=curies),
+            self.query_tx(COOCCURRING_ALERTS_QUERY, curies=curies),
+            asyncio.to_thread(get_realism_score, curies),
+        )
+        data['direct'] = get_direct_relations(res_direct)
+        data['alerts'] = get_cooccurring_alerts(res_alerts)
+        data['realism_score'] = realism_score
+        return data
+
+    async def read_query(self, query: str, **query_params) -> List[List]:
+        """Run a read-only query
+
+        Parameters
+        ----------
+        query :
+            The cypher query to run
+        query_params :
+            The parameters to pass to the query
+
+        Returns
+        -------
+        :
+            The result of the query
+        """
+        return await self._run_transaction(False, query, **query_params)
+
+    async def write_tx(self, query: str,
+                       **query_params) -> Optional[TxResult]:
+        """Run a write query in a transaction
+
+        Parameters
+        ----------
+        query :
+            The cypher query to run
+        query_params :
+            The parameters to pass to the query
+
+        Returns
+        -------
+        :
+            The result of the query
+        """
+        return await self._run_transaction(True, query, **query_params)
+
+    async def read_dict(self, query, **query_params):
+        """Run a read-only query that returns a 2-tuple and put it in a dict."""
+        return dict(await self.read_query(query, **query_params))
+
+
+#: The query checking if the graph has precomputed isa_closure edges
+HAS_CLOSURE_QUERY = "MATCH ()-[r:isa_closure]->() RETURN 1 LIMIT 1"
+
+#: The query for indicators of a geolocation, its parts or what it's part of
+INDICATORS_QUERY = """
+    MATCH (i:indicator)<-[r:has_indicator]-(geolocation:geoloc)
+    MATCH path = (geolocation)-[r_t:isa*0..]->(geolocation_isa:geoloc {curie: $geolocation_curie})
+    WHERE i.name CONTAINS $indicator_filter
+    RETURN i, r, geolocation, nodes(path)[1..] AS geolocation_isa
+    UNION 
+    MATCH (i:indicator)<-[r:has_indicator]-(geolocation:geoloc)
+    MATCH path = (geolocation)<-[r_t:isa*0..]-(geolocation_isa:geoloc {curie: $geolocation_curie})
+    WHERE i.name CONTAINS $indicator_filter
+    RETURN i, r, geolocation, nodes(path)[1..] AS geolocation_isa
+"""
+
+#: The indicators query finding the geolocations with isa_closure edges, so
+#: that isa paths are only expanded between them and the given geolocation
+INDICATORS_CLOSURE_QUERY = """
+    MATCH (geolocation_isa:geoloc {curie: $geolocation_curie})<-[:isa_closure]-(geolocation:geoloc)-[r:has_indicator]->(i:indicator)
+    WHERE i.name CONTAINS $indicator_filter
+    MATCH path = (geolocation)-[r_t:isa*0..]->(geolocation_isa)
+    RETURN i, r, geolocation, nodes(path)[1..] AS geolocation_isa
+    UNION
+    MATCH (geolocation_isa:geoloc {curie: $geolocation_curie})-[:isa_closure]->(geolocation:geoloc)-[r:has_indicator]->(i:indicator)
+    WHERE i.name CONTAINS $indicator_filter
+    MATCH path = (geolocation)<-[r_t:isa*0..]-(geolocation_isa)
+    RETURN i, r, geolocation, nodes(path)[1..] AS geolocation_isa
+"""
+
+# Query for direct relationships between the terms
+# TODO: we should add an entity tag to all of the
+# domain-specific terms to make these queries scale
+DIRECT_RELATIONS_QUERY = """
+    MATCH (a:entity)-[r]->(b:entity)
+    WHERE a.curie IN $curies AND b.curie IN $curies
+    RETURN a, r, b
+"""
+
+# Query for alerts in which these co-occur in any pairs
+COOCCURRING_ALERTS_QUERY = """
+    MATCH (n:alert)-[:mentions]->(a)
+    MATCH (n:alert)-[:mentions]->(b)
+    WHERE a.curie IN $curies AND b.curie IN $curies
+    AND a <> b
+    RETURN n, a, b
+"""
+
+
+def get_indicators_query(geolocation: str, indicator_filter: str,
+                         use_closure: bool = False):
+    """Return the indicators query and its parameters."""
+    query_parameters = {
+        "geolocation_curie": get_curie(geolocation),
+        "indicator_filter": indicator_filter
+    }
+    query = INDICATORS_CLOSURE_QUERY if use_closure else INDICATORS_QUERY
+    return query, query_parameters
+
+
+def get_indicator_results(res):
+    """Return the indicators and their data from rows of the query."""
+    data = []
+    for row in res:
+        if not isinstance(row[3], list):
+            data.append({
+                'indicator': dict(row[0]),
+                'data': json.loads(dict(row[1])['years_data']),
+                'geolocation': dict(row[2]),
+                'geolocation_isa': dict(row[3]),
+            })
+        else:
+            geolocation_isa = [dict(row_ele) for row_ele in row[3]]
+            data.append({
+                'indicator': dict(row[0]),
+                'data': json.loads(dict(row[1])['years_data']),
+                'geolocation': dict(row[2]),
+                'geolocation_isa': geolocation_isa,
+            })
+    return data
+
+
+def get_alerts_query(
+    disease: str = None,
+    geolocation: str = None,
+    pathogen: str = None,
+    timestamp: str = None,
+    symptom: str = None,
+    limit: int = None,
+    use_closure: bool = False,
+    cursor: Optional[List[str]] = None,
+    ordered: bool = False,
+):
+    """Return the query for alerts mentioning the given entities.
+
+    If use_closure is True, ancestors are matched with the precomputed
+    isa_closure and phenotype_closure edges instead of expanding paths.
+
+    If ordered is True, rows are ordered by the timestamp and CURIE of the
+    alert, and then by the CURIEs of the returned entities, which makes
+    the order of rows total. If a cursor, i.e., the sort keys of a row
+    returned by get_cursor_keys, is given, only the rows after it are
+    returned.
+
+    Returns
+    -------
+    :
+        The query, its parameters and the names of the entities returned
+        with each alert, or None if an entity can't be grounded.
+    """
+    search_query = "MATCH (n:alert)-[:mentions]->(m)"
+    query_parameters = {}
+    isa = "[:isa_closure]" if use_closure else "[:isa*0..]"
+    has_phenotype_isa = "[:isa_closure|phenotype_closure]" if use_closure \
+        else "[:has_phenotype|isa*0..]"
+    returned = ["n", "n.timestamp"]
+    result_elements = []
+    if timestamp:
+        search_query += " WHERE n.timestamp = $timestamp"
+        query_parameters["timestamp"] = timestamp
+    if disease:
+        disease_curie = get_curie(disease)
+        if disease_curie is None:
+            return None
+        search_query += (
+            " MATCH (n:alert)-[r_d:mentions]->(disease:disease)-"
+            f"{isa}->(disease_isa:disease {{curie: $disease_curie}})"
+        )
+        query_parameters["disease_curie"] = disease_curie
+        returned += ["disease", "disease_isa"]
+        result_elements.append('disease')
+    if geolocation:
+        geolocation_curie = get_curie(geolocation)
+        if geolocation_curie is None:
+            return None
+        search_query += (
+            " MATCH (n:alert)-[r_g:mentions]->(geolocation:geoloc)-"
+            f"{isa}->(geolocation_isa:geoloc {{curie: $geolocation_curie}})"
+        )
+        query_parameters["geolocation_curie"] = geolocation_curie
+        returned += ["geolocation", "geolocation_isa"]
+        result_elements.append('geoloc')
+    if pathogen:
+        pathogen_curie = get_curie(pathogen)
+        if pathogen_curie is None:
+            return None
+        search_query += (
+            " MATCH (n:alert)-[r_p:mentions]->(pathogen:pathogen)-"
+            f"{isa}->(pathogen_isa:pathogen {{curie: $pathogen_curie}})"
+        )
+        query_parameters["pathogen_curie"] = pathogen_curie
+        returned += ["pathogen", "pathogen_isa"]
+        result_elements.append('pathogen')
+    if symptom:
+        symptom_curie = get_curie(symptom)
+        if symptom_curie is None:
+            return None
+        search_query += (
+            " MATCH (n)-[r_s:mentions]->(symptom:disease)-"
+            f"{has_phenotype_isa}->(symptom_isa:disease {{curie:$symptom_curie}})"
+        )
+        query_parameters["symptom_curie"] = symptom_curie
+        returned += ["symptom", "symptom_isa"]
+        result_elements.append('symptom')
+    if ordered or cursor:
+        nodes = [returned[0]] + returned[2:]
+        sort_keys = ["coalesce(n.timestamp, '')"] + \
+            [f"{node}.curie" for node in nodes]
+        search_query += " WITH DISTINCT " + ", ".join(nodes)
+        if cursor:
+            if len(cursor) != len(sort_keys):
+                raise ValueError("The cursor is not for this query")
+            search_query += " WHERE " + get_after_condition(sort_keys)
+            query_parameters["cursor"] = cursor
+        search_query += " RETURN " + ", ".join(returned) + \
+            " ORDER BY " + ", ".join(sort_keys)
+    else:
+        search_query += " RETURN DISTINCT " + ", ".join(returned)
+    if limit:
+        search_query += " LIMIT $limit"
+        query_parameters["limit"] = int(limit)
+    return search_query, query_parameters, result_elements
+
+
+def get_after_condition(sort_keys: List[str]) -> str:
+    """Return the condition that sort keys come after those of the cursor."""
+    # Lexicographic comparison, built from the last key to the first
+    condition = f"{sort_keys[-1]} > $cursor[{len(sort_keys) - 1}]"
+    for idx in range(len(sort_keys) - 2, -1, -1):
+        condition = (f"{sort_keys[idx]} > $cursor[{idx}] OR "
+                     f"({sort_keys[idx]} = $cursor[{idx}] AND ({condition}))")
+    return condition
+
+
+def get_cursor_keys(row) -> List[str]:
+    """Return the sort keys of a row of an ordered alerts query."""
+    return [row[1] or ""] + [node["curie"] for node in [row[0]] + row[2:]]
+
+
+def encode_cursor(keys: List[str]) -> str:
+    """Return an opaque continuation token for the sort keys of a row."""
+    return base64.urlsafe_b64encode(json.dumps(keys).encode()).decode()
+
+
+def decode_cursor(token: str) -> List[str]:
+    """Return the sort keys in a continuation token from encode_cursor."""
+    try:
+        keys = json.loads(base64.urlsafe_b64decode(token.encode()))
+    except (ValueError, binascii.Error):
+        raise ValueError("Invalid cursor")
+    if not isinstance(keys, list) or \
+            not all(isinstance(key, str) for key in keys):
+        raise ValueError("Invalid cursor")
+    return keys
+
+
+def get_next_cursor(res, page_size: int) -> Optional[str]:
+    """Return the token of the page after a full page of rows, if any."""
+    if not res or len(res) < page_size:
+        return None
+    return encode_cursor(get_cursor_keys(res[-1]))
+
+
+def get_alert_results(res, result_elements: List[str]):
+    """Return the alerts and their entities from rows of the alerts query."""
+    return [get_alert_result(row, result_elements) for row in res]
+
+
+def get_alert_result(row, result_elements: List[str]):
+    """Return an alert and its entities from a row of the alerts query."""
+    alert = dict(row[0])
+    alert['timestamp'] = row[1]
+    data = {'alert': alert}
+    for idx, element in enumerate(result_elements):
+        # First element is the given entity, the next is any isa entity
+        i = idx * 2 + 2
+        data[element] = dict(row[i])
+        data[element + '_isa'] = dict(row[i + 1])
+    return data
+
+
+def get_text_annotations(text: str):
+    """Return the MeSH and geonames terms recognized in a text."""
+    annotations = gilda.annotate(text, namespaces=['MESH', 'geonames'])
+    def get_type(db, id):
+        if is_disease(db, id):
+            return 'disease'
+        elif is_geoloc(db, id):
+            return 'geoloc'
+        elif is_pathogen(db, id):
+            return 'pathogen'
+        else:
+            return 'other'
+
+    return [
+        {
+            'text': a.text,
+            'name': a.matches[0].term.entry_name,
+            'curie': f'{a.matches[0].term.db}:{a.matches[0].term.id}',
+            'type': get_type(a.matches[0].term.db, a.matches[0].term.id),
+        }
+        for a in annotations
+    ]
+
+
+def get_direct_relations(res_direct):
+    """Return the relations between terms from rows of their query."""
+    direct = []
+    for res in res_direct:
+        a, r, b = res
+        entry = {
+            'a': dict(a),
+            'b': dict(b),
+            'r': dict(r)
+        }
+        direct.append(entry)
+    return direct
+
+
+def get_cooccurring_alerts(res_alerts):
+    """Return the alerts with the most co-occurring terms with their terms."""
+    # We reorganize alerts so that we can merge all entities
+    # appearing in them into a single alert entry
+    entities_by_curie = {}
+    entities_by_alert = defaultdict(set)
+    alerts_by_name = {}
+    for res in res_alerts:
+        alert = dict(res[0])
+        a = dict(res[1])
+        b = dict(res[2])
+        entities_by_alert[alert['name']] |= {a['curie'], b['curie']}
+        entities_by_curie[a['curie']] = a
+        entities_by_curie[b['curie']] = b
+        alerts_by_name[alert['name']] = alert
+    sorted_alerts = sorted(alerts_by_name.items(), key=lambda x: len(entities_by_alert[x[0]]),
+                           reverse=True)
+    top_alerts = sorted_alerts[:500]
+    # We now generate the actual alert entries
+    alerts = []
+    for alert_id, alert in top_alerts:
+        entities = [entities_by_curie[entity]
+                    for entity in entities_by_alert[alert_id]]
+        alerts.append({'alert': alert, 'entities': entities})
+    return alerts
+
+
+def get_realism_score(curies: List[str]):
+    """Return how realistic the co-occurrence of the MeSH terms is."""
+    mesh_ids = [c.lstrip('MESH:') for c in curies
+                if c.startswith('MESH:')]
+    scores, score_sum = get_coocurrence_score(mesh_ids)
+    scores = [
+        [m1, m2, s] for (m1, m2), s in scores.items()
+    ]
+    classification = 'high' if score_sum > -4.5 else \
+        'medium' if score_sum > -7 else 'low'
+    return {
+        'scores': scores,
+        'score_sum': score_sum,
+        'classification': classification
+    }
+
+
+literature_cache = LiteratureCache.from_env()
+
+
 def find_literature(mesh_ids, limit=20):
     mesh_ids = [mesh_id.lstrip('MESH:') for mesh_id in mesh_ids]
-    results = get_pvalues(mesh_ids)
+    # Results only depend on the set of MeSH terms that are not excluded
+    cache_key = (tuple(sorted(set(mesh_ids) - exclude_list)), limit)
+    pubmed_meta = literature_cache.get(cache_key)
+    if pubmed_meta is not None:
+        return pubmed_meta
+    results = get_pvalues(mesh_ids, limit=limit)
     pubmed_meta = get_pubmed_meta(results, limit=limit)
+    # Failed metadata requests return None and aren't cached, neither are
+    # results missing PMIDs so that they are requested again
+    if pubmed_meta is not None and \
+            len(pubmed_meta) == len(results.pmid[:limit]):
+        literature_cache.set(cache_key, pubmed_meta)
     return pubmed_meta
 
 
@@ -320,6 +942,12 @@ def do_cypher_tx(tx: Transaction, query: str, **query_params) -> List[List]:
     return [record.values() for record in result]
 
 
+async def do_async_cypher_tx(tx: AsyncTransaction, query: str,
+                             **query_params) -> List[List]:
+    result = await tx.run(query, parameters=query_params)
+    return [record.values() async for record in result]
+
+
 def create_custom_grounder():
     """Returns a custom grounder for MeSH and geonames terms"""
     from gilda.generate_terms import generate_mesh_terms
@@ -332,10 +960,10 @@ def create_custom_grounder():
         replace_greek_spelled_out,
         replace_roman_arabic,
     )
-    import pandas as pd
 
     mesh_gilda_terms = generate_mesh_terms(ignore_mappings=True)
-    geoname_node_df = pd.read_csv(PARENT_DIRECTORY/"geoname_nodes.tsv", sep="\t")
+    geoname_node_df = read_table(str(PARENT_DIRECTORY/"geoname_nodes.tsv"),
+                                 columns=["curie:ID", "name:string"])
     geoname_gilda_terms = []
     for _, geoname_info in geoname_node_df.iterrows():
         name = geoname_info["name:string"]
@@ -0,0 +1,188 @@
+"""
+Optional Parquet copies of node/edge files and NER terms.
+
+When KG_OUTPUT_FORMAT is set to parquet, every TSV file written through a
+sink.TsvSink is also written as a Parquet file next to it, with typed
+columns that are dictionary-encoded on disk. Readers use read_table, which
+loads only the columns they ask for from the Parquet file if there is one,
+and falls back to the TSV file otherwise. The TSV files remain the input
+of the Neo4j import.
+
+pyarrow is only needed when Parquet files are written or read.
+"""
+
+import os
+import json
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+#: The number of rows per Parquet row group written by a ParquetSink
+ROW_GROUP_ROWS = 100_000
+#: The columns of the Parquet table of terms by alert
+TERMS_COLUMNS = ['archive_number', 'db', 'id', 'entry_name']
+
+
+def parquet_output_enabled() -> bool:
+    """Return True if Parquet copies of outputs should be written."""
+    return os.environ.get('KG_OUTPUT_FORMAT', 'tsv').lower() == 'parquet'
+
+
+def get_parquet_path(path: str) -> str:
+    """Return the path of the Parquet copy of a TSV file."""
+    for suffix in ('.tsv.gz', '.tsv', '.json'):
+        if path.endswith(suffix):
+            return path[:-len(suffix)] + '.parquet'
+    return path + '.parquet'
+
+
+def require_pyarrow() -> None:
+    if pa is None:
+        raise ImportError('pyarrow is required for Parquet output, install '
+                          'it with pip install pyarrow')
+
+
+def get_column_type(column: str):
+    """Return the Arrow type of a column given its Neo4j import header."""
+    _, _, neo4j_type = column.rpartition(':')
+    if neo4j_type in {'int', 'long'}:
+        return pa.int64()
+    if neo4j_type in {'float', 'double'}:
+        return pa.float64()
+    return pa.string()
+
+
+class ParquetSink:
+    """A Parquet file written in row groups from rows of a TSV file.
+
+    Parameters
+    ----------
+    path :
+        The path of the Parquet file to write.
+    header :
+        The Neo4j import header of the TSV file, whose type suffixes, e.g.,
+        count:int, determine the types of the columns.
+    """
+
+    def __init__(self, path: str, header: Sequence[str]) -> None:
+        require_pyarrow()
+        self.path = path
+        self.header = list(header)
+        self.schema = pa.schema([(column, get_column_type(column))
+                                 for column in self.header])
+        self._tmp_path = path + '.tmp'
+        self._writer = pq.ParquetWriter(self._tmp_path, self.schema,
+                                        use_dictionary=True)
+        self._rows = []
+
+    def add(self, row: Sequence) -> None:
+        self._rows.append(row)
+        if len(self._rows) >= ROW_GROUP_ROWS:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self._rows:
+            return
+        arrays = []
+        for values, field in zip(zip(*self._rows), self.schema):
+            if pa.types.is_string(field.type):
+                # Values are written the way csv.writer writes them
+                values = ['' if value is None else str(value)
+                          for value in values]
+            arrays.append(pa.array(values, type=field.type))
+        self._writer.write_table(pa.Table.from_arrays(arrays,
+                                                      schema=self.schema))
+        self._rows = []
+
+    def close(self) -> None:
+        self._flush()
+        self._writer.close()
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self) -> None:
+        self._writer.close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+
+def read_table(path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """Read the given columns of a node/edge file.
+
+    Parameters
+    ----------
+    path :
+        The path of the TSV file.
+    columns :
+        The columns to read, by default all of them.
+
+    Returns
+    -------
+    :
+        The table, read from the Parquet copy of the file if it exists.
+    """
+    parquet_path = get_parquet_path(path)
+    if pq is not None and os.path.exists(parquet_path):
+        return pq.read_table(parquet_path, columns=columns).to_pandas()
+    return pd.read_csv(path, sep='\t', usecols=columns)
+
+
+def read_terms_by_alert(path: str) -> Dict[str, List[List[str]]]:
+    """Read the terms extracted from each alert.
+
+    Parameters
+    ----------
+    path :
+        The path of the JSON file of terms by alert written by
+        promed_ner.py.
+
+    Returns
+    -------
+    :
+        The (namespace, ID, entry name) of the terms of each alert, by
+        archive number, read from the Parquet copy of the file if it exists.
+    """
+    parquet_path = get_parquet_path(path)
+    if pq is None or not os.path.exists(parquet_path):
+        with open(path, 'r') as fh:
+            return json.load(fh)
+    table = pq.read_table(parquet_path, columns=TERMS_COLUMNS)
+    terms_by_alert = defaultdict(list)
+    # Alerts without terms have a single row with missing term columns
+    for archive_number, db, id, entry_name in zip(
+            *(table.column(column).to_pylist() for column in TERMS_COLUMNS)):
+        terms = terms_by_alert[archive_number]
+        if db is not None:
+            terms.append([db, id, entry_name])
+    return dict(terms_by_alert)
+
+
+def write_terms_by_alert(terms_by_alert: Dict[str, List[List[str]]],
+                         path: str) -> None:
+    """Write the Parquet copy of a JSON file of terms by alert.
+
+    Parameters
+    ----------
+    terms_by_alert :
+        The (namespace, ID, entry name) of the terms of each alert, by
+        archive number.
+    path :
+        The path of the JSON file the terms are written to.
+    """
+    require_pyarrow()
+    columns = {column: [] for column in TERMS_COLUMNS}
+    for archive_number, terms in terms_by_alert.items():
+        for db, id, entry_name in (terms or [(None, None, None)]):
+            columns['archive_number'].append(archive_number)
+            columns['db'].append(db)
+            columns['id'].append(id)
+            columns['entry_name'].append(entry_name)
+    table = pa.table({column: pa.array(values, type=pa.string())
+                      for column, values in columns.items()})
+    pq.write_table(table, get_parquet_path(path), use_dictionary=True)
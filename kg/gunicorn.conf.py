@@ -0,0 +1,11 @@
+"""
+Settings of the gunicorn server of the REST API in api.py, passed with -c
+in startup.sh.
+"""
+
+
+def on_starting(server):
+    # Indexes are set up once before any worker starts rather than by each
+    # worker when it imports api.py
+    from schema import setup_schema
+    setup_schema()
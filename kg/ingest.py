@@ -0,0 +1,224 @@
+"""
+Incrementally ingest new or changed ProMED alerts into a running Neo4j
+graph instead of rebuilding the graph with neo4j-admin import.
+
+This is run after promed_ner.py --incremental has written the terms of new
+or changed alerts into promed_ner_terms_by_alert_delta.json:
+
+    python ingest.py --apply
+
+The delta node and edge files are written into the delta folder in the
+same format as the files used for the full import, and are then merged
+into the graph in batches. MeSH terms that new alerts mention but that are
+not yet in the graph are added with the label given by the MeSH type index.
+
+Only alerts, their outbreaks and mentions edges, and new term nodes are
+updated incrementally. The occurs_with co-occurrence counts and the
+isa_closure and phenotype_closure edges between existing terms are not,
+and need a full rebuild; new term nodes only get an isa_closure edge to
+themselves.
+"""
+
+import os
+import csv
+import logging
+import argparse
+from collections import defaultdict
+from typing import Dict, Iterable, List
+
+from build import HERE, NER_OUTPUT, get_alert_relations, \
+    get_mentioned_term_nodes, get_outbreak_df, get_outbreak_relations
+from columnar import read_terms_by_alert
+from sink import write_tsv
+
+DELTA_TERMS = os.path.join(NER_OUTPUT, 'promed_ner_terms_by_alert_delta.json')
+DELTA_PATH = os.path.join(HERE, 'delta')
+
+#: The number of rows per UNWIND query
+BATCH_SIZE = 10000
+
+logger = logging.getLogger(__name__)
+
+ALERT_NODES_QUERY = """
+    UNWIND $rows AS row
+    MERGE (n:alert {curie: row.curie})
+    SET n.name = row.name, n.timestamp = row.timestamp
+"""
+# Changed alerts may no longer mention terms they mentioned before
+DELETE_MENTIONS_QUERY = """
+    UNWIND $curies AS curie
+    MATCH (n:alert {curie: curie})-[r:mentions]->()
+    DELETE r
+"""
+EXISTING_TERMS_QUERY = """
+    UNWIND $curies AS curie
+    MATCH (n:entity {curie: curie})
+    RETURN n.curie
+"""
+# Labels can't be parameters, so there is one query per node type
+TERM_NODES_QUERY = """
+    UNWIND $rows AS row
+    MERGE (n:entity {curie: row.curie})
+    ON CREATE SET n.name = row.name, n:%s
+"""
+# isa_closure is reflexive, so new terms need an edge to themselves
+SELF_CLOSURE_QUERY = """
+    UNWIND $curies AS curie
+    MATCH (n:entity {curie: curie})
+    MERGE (n)-[:isa_closure]->(n)
+"""
+MENTIONS_QUERY = """
+    UNWIND $rows AS row
+    MATCH (a:alert {curie: row.source})
+    MATCH (b:entity {curie: row.target})
+    MERGE (a)-[:mentions]->(b)
+    RETURN count(*)
+"""
+OUTBREAK_NODES_QUERY = """
+    UNWIND $rows AS row
+    MERGE (n:outbreak {curie: row.curie})
+    SET n.name = row.name
+"""
+HAS_OUTBREAK_QUERY = """
+    UNWIND $rows AS row
+    MATCH (a:alert {curie: row.source})
+    MATCH (b:outbreak {curie: row.target})
+    MERGE (a)-[:has_outbreak]->(b)
+"""
+
+
+def read_tsv(fname) -> List[Dict[str, str]]:
+    with open(fname, 'r') as fh:
+        return list(csv.DictReader(fh, delimiter='\t'))
+
+
+def assemble_deltas(terms_fname=DELTA_TERMS, delta_path=DELTA_PATH):
+    """Write node and edge files for new or changed alerts.
+
+    Parameters
+    ----------
+    terms_fname :
+        A JSON file of the terms extracted from new or changed alerts, by
+        archive number.
+    delta_path :
+        The folder to write the delta files into.
+    """
+    terms_by_alert = read_terms_by_alert(terms_fname)
+    os.makedirs(delta_path, exist_ok=True)
+    alert_nodes, mention_edges = get_alert_relations(terms_by_alert)
+    outbreak_df = get_outbreak_df()
+    outbreak_nodes, outbreak_edges = get_outbreak_relations(
+        outbreak_df[outbreak_df["archiveNumber"].isin(terms_by_alert)]
+    )
+    n_alerts = write_tsv(
+        os.path.join(delta_path, 'promed_alert_nodes.tsv'),
+        ['curie:ID', 'name:string', 'timestamp:string', ':LABEL'],
+        alert_nodes
+    )
+    n_mentions = write_tsv(os.path.join(delta_path, 'promed_alert_edges.tsv'),
+                           [':START_ID', ':TYPE', ':END_ID'], mention_edges)
+    write_tsv(os.path.join(delta_path, 'mesh_term_nodes.tsv'),
+              ['curie:ID', 'name:string', ':LABEL'],
+              get_mentioned_term_nodes(terms_by_alert))
+    write_tsv(os.path.join(delta_path, 'promed_outbreak_nodes.tsv'),
+              ['curie:ID', 'name:string', ':LABEL'], outbreak_nodes)
+    write_tsv(os.path.join(delta_path, 'promed_alert_outbreak_edges.tsv'),
+              [':START_ID', ':TYPE', ':END_ID'], outbreak_edges)
+    logger.info(f'Wrote deltas for {n_alerts} alerts with {n_mentions} '
+                f'mentions into {delta_path}')
+
+
+def batched(rows: List, batch_size: int = BATCH_SIZE) -> Iterable[List]:
+    for start in range(0, len(rows), batch_size):
+        yield rows[start:start + batch_size]
+
+
+def apply_deltas(client, delta_path=DELTA_PATH, batch_size=BATCH_SIZE):
+    """Merge delta node and edge files into a running graph.
+
+    Parameters
+    ----------
+    client : client.Neo4jClient
+        A client connected to the graph.
+    delta_path :
+        The folder containing the delta files.
+    batch_size :
+        The number of rows to merge per transaction.
+    """
+    alerts = [
+        {'curie': row['curie:ID'], 'name': row['name:string'],
+         'timestamp': row['timestamp:string']}
+        for row in read_tsv(os.path.join(delta_path,
+                                         'promed_alert_nodes.tsv'))
+    ]
+    terms = read_tsv(os.path.join(delta_path, 'mesh_term_nodes.tsv'))
+    mentions = [
+        {'source': row[':START_ID'], 'target': row[':END_ID']}
+        for row in read_tsv(os.path.join(delta_path,
+                                         'promed_alert_edges.tsv'))
+    ]
+    outbreaks = [
+        {'curie': row['curie:ID'], 'name': row['name:string']}
+        for row in read_tsv(os.path.join(delta_path,
+                                         'promed_outbreak_nodes.tsv'))
+    ]
+    has_outbreaks = [
+        {'source': row[':START_ID'], 'target': row[':END_ID']}
+        for row in read_tsv(os.path.join(delta_path,
+                                         'promed_alert_outbreak_edges.tsv'))
+    ]
+    existing = set()
+    for batch in batched([row['curie:ID'] for row in terms], batch_size):
+        existing.update(curie for curie, in
+                        client.query_tx(EXISTING_TERMS_QUERY, curies=batch))
+    new_terms_by_label = defaultdict(list)
+    for row in terms:
+        if row['curie:ID'] not in existing:
+            # The label is the node type followed by entity
+            node_type = row[':LABEL'].split(';')[0]
+            new_terms_by_label[node_type].append(
+                {'curie': row['curie:ID'], 'name': row['name:string']})
+    has_closure = client.has_closure()
+    for node_type, rows in new_terms_by_label.items():
+        for batch in batched(rows, batch_size):
+            client.write_tx(TERM_NODES_QUERY % node_type, rows=batch)
+            if has_closure:
+                client.write_tx(SELF_CLOSURE_QUERY,
+                                curies=[row['curie'] for row in batch])
+    n_new_terms = sum(len(rows) for rows in new_terms_by_label.values())
+    for batch in batched(alerts, batch_size):
+        client.write_tx(ALERT_NODES_QUERY, rows=batch)
+        client.write_tx(DELETE_MENTIONS_QUERY,
+                        curies=[row['curie'] for row in batch])
+    n_merged = 0
+    for batch in batched(mentions, batch_size):
+        n_merged += client.write_tx(MENTIONS_QUERY, rows=batch)[0][0]
+    if n_merged < len(mentions):
+        logger.warning(f'{len(mentions) - n_merged} mentions were skipped '
+                       f'since their terms are not in the graph')
+    for batch in batched(outbreaks, batch_size):
+        client.write_tx(OUTBREAK_NODES_QUERY, rows=batch)
+    for batch in batched(has_outbreaks, batch_size):
+        client.write_tx(HAS_OUTBREAK_QUERY, rows=batch)
+    logger.info(f'Merged {len(alerts)} alerts, {n_merged} mentions, '
+                f'{n_new_terms} new terms and {len(has_outbreaks)} outbreak '
+                f'links into the graph')
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--terms', default=DELTA_TERMS,
+                        help='JSON file of terms of new or changed alerts')
+    parser.add_argument('--apply', action='store_true',
+                        help='Merge the deltas into the running graph. '
+                             'occurs_with counts and closure edges between '
+                             'existing terms are not updated and need a '
+                             'full rebuild')
+    args = parser.parse_args()
+    assemble_deltas(args.terms)
+    if args.apply:
+        from client import Neo4jClient
+        apply_deltas(Neo4jClient())
@@ -0,0 +1,147 @@
+"""
+A least-recently-used cache with expiry for literature search results,
+optionally backed by an SQLite file so that entries survive restarts and
+are shared between API workers.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class LiteratureCache:
+    """An LRU cache whose entries expire after a given time.
+
+    Parameters
+    ----------
+    max_size :
+        The maximum number of entries to keep in memory.
+    ttl :
+        The number of seconds after which an entry expires.
+    path :
+        An optional path to an SQLite file used as a second, on-disk tier.
+        Entries found on disk are promoted to memory.
+    max_disk_size :
+        The maximum number of entries to keep on disk.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 1024,
+        ttl: float = 24 * 60 * 60,
+        path: Optional[str] = None,
+        max_disk_size: int = 100_000,
+    ) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self.path = path
+        self.max_disk_size = max_disk_size
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if self.path:
+            with self._connect() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS cache "
+                    "(key TEXT PRIMARY KEY, value TEXT, created REAL)"
+                )
+
+    @classmethod
+    def from_env(cls) -> "LiteratureCache":
+        """Return a cache configured by LITERATURE_CACHE_* variables."""
+        return cls(
+            max_size=int(os.environ.get("LITERATURE_CACHE_SIZE", 1024)),
+            ttl=float(os.environ.get("LITERATURE_CACHE_TTL", 24 * 60 * 60)),
+            path=os.environ.get("LITERATURE_CACHE_PATH"),
+            max_disk_size=int(
+                os.environ.get("LITERATURE_CACHE_DISK_SIZE", 100_000)
+            ),
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value for a key or None if missing or expired."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                created, value = entry
+                if now - created < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+        if self.path:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT value, created FROM cache WHERE key = ?",
+                    (json.dumps(key),),
+                ).fetchone()
+            if row is not None and now - row[1] < self.ttl:
+                value = json.loads(row[0])
+                with self._lock:
+                    self._add(key, value, row[1])
+                    self.disk_hits += 1
+                return value
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Cache a JSON-serializable value under the given key."""
+        now = time.time()
+        with self._lock:
+            self._add(key, value, now)
+        if self.path:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO cache VALUES (?, ?, ?)",
+                    (json.dumps(key), json.dumps(value), now),
+                )
+                conn.execute(
+                    "DELETE FROM cache WHERE created < ?", (now - self.ttl,)
+                )
+                conn.execute(
+                    "DELETE FROM cache WHERE key NOT IN "
+                    "(SELECT key FROM cache ORDER BY created DESC LIMIT ?)",
+                    (self.max_disk_size,),
+                )
+
+    def _add(self, key: Hashable, value: Any, created: float) -> None:
+        self._entries[key] = (created, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Remove all entries from memory and disk."""
+        with self._lock:
+            self._entries.clear()
+        if self.path:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM cache")
+
+    def stats(self) -> dict:
+        """Return the size of the cache and its hit and miss counts.
+
+        The size and counts are those of this process. Under gunicorn each
+        worker process has its own cache object, so they only cover the
+        requests served by one worker, even if the disk tier is shared.
+        """
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+            }
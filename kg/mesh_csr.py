@@ -1,28 +1,28 @@
 import os
-import csv
 import json
+import time
+import shutil
+import resource
+import tempfile
 import tqdm
 import pystow
 import numpy as np
 import pandas as pd
+from functools import lru_cache
 from collections import Counter
-from scipy.sparse import coo_matrix
+from scipy.sparse import csr_matrix, csc_matrix
 from scipy.sparse import save_npz, load_npz
-from scipy.stats import fisher_exact
+from scipy.stats import hypergeom
 
 from util import get_mesh_type
-from indra.literature import pubmed_client
+from pubmed_store import get_pubmed_store
 
 mesh_file = pystow.join('indra', 'cogex', 'pubmed', name='mesh_pmids.csv')
 
-print('Loading MeSH-PubMed resource files')
-csr = load_npz('mesh_pmid_matrix.npz')
-with open('mesh_mapping.json', 'r') as fh:
-    mesh_mapping = json.load(fh)
-with open('pmid_mapping.json', 'r') as fh:
-    pmid_mapping = json.load(fh)
-with open('mesh_types.json', 'r') as fh:
-    mesh_types = json.load(fh)
+#: Directory of the memory-mapped MeSH-PMID bundle
+BUNDLE_PATH = 'mesh_pmid_bundle'
+#: Version of the bundle layout, to be incremented whenever it changes
+BUNDLE_VERSION = 2
 
 exclude_list = {
     'D003142',
@@ -47,115 +47,538 @@ exclude_list = {
     'D003933'
 }
 
+#: The coarse types assigned to MeSH terms by util.get_mesh_type
+MESH_TYPES = ['disease', 'geoloc', 'pathogen', 'other']
+#: The MeSH types relevant for ranking literature on outbreaks
+RELEVANT_MESH_TYPES = ['geoloc', 'disease', 'pathogen']
 
-def build_mesh_csr():
-    mesh_counter = 0
-    pmid_counter = 0
+
+class MeshPmidIndex:
+    """The MeSH-PMID matrix along with the IDs of its rows and columns.
+
+    Parameters
+    ----------
+    csr : scipy.sparse.csr_matrix
+        The matrix of PMIDs (rows) by MeSH terms (columns) whose values are
+        2 for major topics and 1 otherwise.
+    pmids : np.ndarray
+        The sorted int64 array of PMIDs corresponding to rows.
+    mesh_ids : np.ndarray
+        The sorted string array of MeSH IDs corresponding to columns.
+    mesh_type_codes : np.ndarray
+        The index of the type of each MeSH term in MESH_TYPES.
+    csc : Optional[scipy.sparse.csc_matrix]
+        The same matrix in column-major format, i.e., a posting list of
+        sorted row indices for each MeSH term. If not given, it is derived
+        from the CSR matrix on first use.
+    """
+
+    #: If a query touches more postings than this fraction of all rows,
+    #: per-row counts are accumulated in a dense array rather than by
+    #: sorting the postings
+    dense_count_ratio = 0.1
+
+    def __init__(self, csr, pmids, mesh_ids, mesh_type_codes, csc=None):
+        self.csr = csr
+        self.pmids = pmids
+        self.mesh_ids = mesh_ids
+        self.mesh_type_codes = mesh_type_codes
+        self._csc = csc
+
+    @property
+    def csc(self):
+        """The MeSH-PMID matrix in column-major format."""
+        if self._csc is None:
+            self._csc = self.csr.tocsc()
+        return self._csc
+
+    def get_mesh_indices(self, mesh_ids):
+        """Return the column indices of the given MeSH IDs.
+
+        Raises a KeyError if any of the MeSH IDs is not in the matrix.
+        """
+        mesh_ids = np.array(mesh_ids, dtype=str)
+        indices = np.searchsorted(self.mesh_ids, mesh_ids)
+        found = indices < len(self.mesh_ids)
+        found[found] = self.mesh_ids[indices[found]] == mesh_ids[found]
+        if not found.all():
+            raise KeyError(mesh_ids[~found][0])
+        return indices
+
+    def get_overlaps(self, mesh_indices, threshold):
+        """Return PMIDs whose weighted overlap with a query meets a threshold.
+
+        Candidate rows are found from the posting lists of the query terms,
+        in time proportional to the number of postings touched, rather than
+        by slicing columns out of the CSR matrix. Rows are counted in a
+        dense accumulator for queries touching many postings and by sorting
+        the postings otherwise.
+
+        Parameters
+        ----------
+        mesh_indices : np.ndarray
+            The column indices of the query MeSH terms.
+        threshold : int
+            The minimum sum of the matrix values of the query terms (where
+            major topics count twice) for a row to be a candidate.
+
+        Returns
+        -------
+        rows : np.ndarray
+            The sorted row indices of candidate PMIDs.
+        overlap_matrix : scipy.sparse.csr_matrix
+            A binary matrix of candidates by query terms indicating which
+            of the query terms each candidate is annotated with.
+        """
+        submatrix = self.csc[:, mesh_indices]
+        posting_rows = submatrix.indices
+        posting_terms = np.repeat(np.arange(len(mesh_indices)),
+                                  np.diff(submatrix.indptr))
+        total_rows = self.csr.shape[0]
+        if threshold <= 0:
+            rows = np.arange(total_rows)
+        elif len(posting_rows) > self.dense_count_ratio * total_rows:
+            counts = np.bincount(posting_rows, weights=submatrix.data,
+                                 minlength=total_rows)
+            rows = np.flatnonzero(counts >= threshold)
+        else:
+            unique_rows, inverse = np.unique(posting_rows,
+                                             return_inverse=True)
+            counts = np.bincount(inverse, weights=submatrix.data)
+            rows = unique_rows[counts >= threshold]
+        # Keep only the postings of candidate rows and index them by the
+        # position of their row among candidates
+        positions = np.searchsorted(rows, posting_rows)
+        keep = positions < len(rows)
+        keep[keep] = rows[positions[keep]] == posting_rows[keep]
+        overlap_matrix = csr_matrix(
+            (np.ones(keep.sum(), dtype=np.int64),
+             (positions[keep], posting_terms[keep])),
+            shape=(len(rows), len(mesh_indices)))
+        return rows, overlap_matrix
+
+
+def write_bundle(csr, pmids, mesh_ids, mesh_types, path=BUNDLE_PATH):
+    """Write the MeSH-PMID matrix and its metadata as a bundle of arrays.
+
+    The bundle is a directory of .npy files that can be memory-mapped, so
+    that API workers loading it share the same pages through the page cache
+    instead of each parsing their own copy. Rows and columns are reordered
+    so that PMIDs and MeSH IDs are sorted.
+
+    Parameters
+    ----------
+    csr : scipy.sparse.csr_matrix
+        The matrix of PMIDs (rows) by MeSH terms (columns).
+    pmids : np.ndarray
+        The PMID corresponding to each row.
+    mesh_ids : list[str]
+        The MeSH ID corresponding to each column.
+    mesh_types : dict[str, str]
+        The type of each MeSH term, one of MESH_TYPES.
+    path : str
+        The directory to write the bundle into.
+    """
+    pmids = np.asarray(pmids, dtype=np.int64)
+    if np.any(pmids[1:] < pmids[:-1]):
+        row_order = np.argsort(pmids, kind='stable')
+        csr = csr[row_order]
+        pmids = pmids[row_order]
+
+    mesh_ids = np.array(mesh_ids, dtype=str)
+    column_order = np.argsort(mesh_ids, kind='stable')
+    new_columns = np.empty_like(column_order)
+    new_columns[column_order] = np.arange(len(column_order))
+    mesh_ids = mesh_ids[column_order]
+    index_dtype = np.int32 if csr.nnz < np.iinfo(np.int32).max \
+        else np.int64
+    csr = csr_matrix((csr.data.astype(np.int8),
+                      new_columns[csr.indices].astype(index_dtype),
+                      csr.indptr.astype(index_dtype)), shape=csr.shape)
+    csr.sort_indices()
+    csc = csr.tocsc()
+    csc.sort_indices()
+    mesh_type_codes = np.array([MESH_TYPES.index(mesh_types[mesh_id])
+                                for mesh_id in mesh_ids], dtype=np.uint8)
+
+    # We write into a temporary directory first so that readers never
+    # see a partially written bundle
+    parent = os.path.dirname(os.path.abspath(path))
+    tmp_path = tempfile.mkdtemp(dir=parent)
+    arrays = {
+        'indptr': csr.indptr,
+        'indices': csr.indices,
+        'data': csr.data,
+        'pmids': pmids,
+        'mesh_ids': mesh_ids,
+        'mesh_type_codes': mesh_type_codes,
+        'postings_indptr': csc.indptr.astype(index_dtype),
+        'postings': csc.indices.astype(index_dtype),
+        'postings_data': csc.data,
+    }
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_path, f'{name}.npy'), array)
+    manifest = {
+        'version': BUNDLE_VERSION,
+        'shape': list(csr.shape),
+        'nnz': int(csr.nnz),
+        'mesh_types': MESH_TYPES,
+        'arrays': sorted(arrays),
+    }
+    with open(os.path.join(tmp_path, 'manifest.json'), 'w') as fh:
+        json.dump(manifest, fh, indent=1)
+    try:
+        os.rename(tmp_path, path)
+    except OSError:
+        # Another process has written the bundle in the meantime
+        shutil.rmtree(tmp_path)
+
+
+def load_bundle(path=BUNDLE_PATH):
+    """Load a MeSH-PMID bundle with its arrays memory-mapped.
+
+    Parameters
+    ----------
+    path : str
+        The directory of the bundle.
+
+    Returns
+    -------
+    MeshPmidIndex
+        The MeSH-PMID matrix along with its row and column IDs.
+    """
+    with open(os.path.join(path, 'manifest.json'), 'r') as fh:
+        manifest = json.load(fh)
+    if manifest['version'] > BUNDLE_VERSION:
+        raise ValueError(f'Bundle at {path} has version '
+                         f'{manifest["version"]}, expected at most '
+                         f'{BUNDLE_VERSION}')
+    arrays = {name: np.load(os.path.join(path, f'{name}.npy'),
+                            mmap_mode='r')
+              for name in manifest['arrays']}
+    shape = tuple(manifest['shape'])
+    csr = csr_matrix((arrays['data'], arrays['indices'], arrays['indptr']),
+                     shape=shape, copy=False)
+    # Bundles before version 2 don't contain posting lists, in which case
+    # they are derived from the CSR matrix when first needed
+    if 'postings' in arrays:
+        csc = csc_matrix((arrays['postings_data'], arrays['postings'],
+                          arrays['postings_indptr']), shape=shape,
+                         copy=False)
+    else:
+        csc = None
+    return MeshPmidIndex(csr, arrays['pmids'], arrays['mesh_ids'],
+                         arrays['mesh_type_codes'], csc=csc)
+
+
+def load_legacy_resources():
+    """Load the MeSH-PMID matrix from the .npz and JSON resource files.
+
+    Returns
+    -------
+    csr : scipy.sparse.csr_matrix
+        The matrix of PMIDs (rows) by MeSH terms (columns).
+    pmids : np.ndarray
+        The PMID corresponding to each row.
+    mesh_ids : list[str]
+        The MeSH ID corresponding to each column.
+    mesh_types : dict[str, str]
+        The type of each MeSH term.
+    """
+    csr = load_npz('mesh_pmid_matrix.npz')
+    with open('mesh_mapping.json', 'r') as fh:
+        mesh_mapping = json.load(fh)
+    with open('mesh_types.json', 'r') as fh:
+        mesh_types = json.load(fh)
+    mesh_ids = sorted(mesh_mapping, key=mesh_mapping.get)
+    # Older builds stored PMIDs in the order of first appearance in a JSON
+    # mapping, newer ones store them as an array
+    if os.path.exists('pmid_index.npy'):
+        pmids = np.load('pmid_index.npy')
+    else:
+        with open('pmid_mapping.json', 'r') as fh:
+            pmid_mapping = json.load(fh)
+        pmids = np.empty(len(pmid_mapping), dtype=np.int64)
+        pmids[np.fromiter(pmid_mapping.values(), dtype=np.int64,
+                          count=len(pmid_mapping))] = \
+            np.fromiter(pmid_mapping.keys(), dtype=np.int64,
+                        count=len(pmid_mapping))
+    return csr, pmids, mesh_ids, mesh_types
+
+
+@lru_cache(maxsize=1)
+def get_mesh_pmid_index():
+    """Return the MeSH-PMID index, loading it on first use.
+
+    If the bundle doesn't exist yet, it is first converted from the
+    legacy .npz and JSON resource files.
+    """
+    if not os.path.exists(BUNDLE_PATH):
+        print('Converting MeSH-PubMed resource files into a bundle')
+        write_bundle(*load_legacy_resources())
+    print('Loading MeSH-PubMed bundle')
+    return load_bundle()
+
+
+def read_mesh_pmid_chunks(chunk_size):
+    """Yield chunks of the MeSH-PMID CSV file as typed DataFrames."""
+    return pd.read_csv(mesh_file, header=0,
+                       names=['mesh_id', 'major', 'pmid'],
+                       dtype={'mesh_id': str, 'major': np.int8,
+                              'pmid': np.int64},
+                       chunksize=chunk_size)
+
+
+def report_progress(stage, n_rows, start_time):
+    """Print the throughput of a build stage and the peak memory so far."""
+    elapsed = time.perf_counter() - start_time
+    # ru_maxrss is reported in kilobytes on Linux
+    peak_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e6
+    print(f'{stage}: {n_rows} rows in {elapsed:.1f}s '
+          f'({n_rows / max(elapsed, 1e-9):.0f} rows/s), '
+          f'peak memory {peak_memory:.2f} GB')
+
+
+def build_mesh_csr(chunk_size=10_000_000):
+    """Build the MeSH-PMID matrix by streaming through the CSV file.
+
+    The CSV file is read twice in chunks of typed NumPy arrays. The first
+    pass collects the sorted unique PMIDs, the MeSH terms in order of first
+    appearance along with their types, and the number of MeSH terms of each
+    PMID. The second pass fills the preallocated CSR index and data arrays
+    in place, so peak memory is bounded by the size of the final matrix
+    rather than by Python lists of all its entries.
+
+    Rows of the matrix correspond to PMIDs in increasing order and columns
+    to MeSH terms in order of first appearance in the CSV file.
+
+    Parameters
+    ----------
+    chunk_size :
+        The number of CSV rows to process at a time.
+
+    Returns
+    -------
+    scipy.sparse.csr_matrix
+        The MeSH-PMID matrix whose values are 2 for major topics and 1
+        otherwise.
+    """
     mesh_mapping = {}
-    pmid_mapping = {}
     mesh_types = {}
 
-    pmid_indices = []
-    mesh_indices = []
-    values = []
-
-    with open(mesh_file, 'r') as fh:
-        reader = csv.reader(fh)
-        next(reader)
-        for row in tqdm.tqdm(reader, total=339439482):
-            mesh_id, major, pmid = row
-            if mesh_id not in mesh_types:
-                mesh_types[mesh_id] = get_mesh_type('MESH', mesh_id)
-            if mesh_id not in mesh_mapping:
-                mesh_mapping[mesh_id] = mesh_counter
-                mesh_counter += 1
-            if pmid not in pmid_mapping:
-                pmid_mapping[pmid] = pmid_counter
-                pmid_counter += 1
-            pmid_indices.append(pmid_mapping[pmid])
-            mesh_indices.append(mesh_mapping[mesh_id])
-            values.append(int(major) + 1)
-
-    print('Number of unique PMIDs:', len(pmid_mapping))
+    # First pass: collect PMIDs, MeSH terms and the number of terms per PMID
+    start_time = time.perf_counter()
+    n_rows = 0
+    pmids = np.array([], dtype=np.int64)
+    pmid_counts = np.array([], dtype=np.int64)
+    with tqdm.tqdm(total=339439482, desc='Indexing') as pbar:
+        for chunk in read_mesh_pmid_chunks(chunk_size):
+            for mesh_id in pd.unique(chunk['mesh_id']):
+                if mesh_id not in mesh_mapping:
+                    mesh_mapping[mesh_id] = len(mesh_mapping)
+                    mesh_types[mesh_id] = get_mesh_type('MESH', mesh_id)
+            chunk_pmids, chunk_counts = \
+                np.unique(chunk['pmid'].to_numpy(), return_counts=True)
+            pmids, inverse = np.unique(np.concatenate([pmids, chunk_pmids]),
+                                       return_inverse=True)
+            pmid_counts = np.bincount(
+                inverse, weights=np.concatenate([pmid_counts, chunk_counts]),
+                minlength=len(pmids)).astype(np.int64)
+            n_rows += len(chunk)
+            pbar.update(len(chunk))
+    report_progress('Indexing', n_rows, start_time)
+
+    print('Number of unique PMIDs:', len(pmids))
     print('Number of unique MeSH terms:', len(mesh_mapping))
-    # Dump mappings as JSON
+    # Dump mappings
     with open('mesh_mapping.json', 'w') as fh:
         json.dump(mesh_mapping, fh, indent=1)
 
-    with open('pmid_mapping.json', 'w') as fh:
-        json.dump(pmid_mapping, fh, indent=1)
-
     with open('mesh_types.json', 'w') as fh:
         json.dump(mesh_types, fh, indent=1)
 
-    print('Creating sparse matrix')
-    coo = coo_matrix((values, (pmid_indices, mesh_indices)),
-                     shape=(len(pmid_mapping), len(mesh_mapping)))
-    print('Converting to CSR')
-    csr = coo.tocsr()
+    np.save('pmid_index.npy', pmids)
+
+    # Second pass: fill the index and data arrays of the matrix row by row
+    start_time = time.perf_counter()
+    indptr = np.zeros(len(pmids) + 1, dtype=np.int64)
+    np.cumsum(pmid_counts, out=indptr[1:])
+    del pmid_counts
+    indices = np.empty(indptr[-1], dtype=np.int32)
+    data = np.empty(indptr[-1], dtype=np.int8)
+    # The next free position in each row
+    cursors = indptr[:-1].copy()
+    with tqdm.tqdm(total=n_rows, desc='Filling') as pbar:
+        for chunk in read_mesh_pmid_chunks(chunk_size):
+            rows = np.searchsorted(pmids, chunk['pmid'].to_numpy())
+            order = np.argsort(rows, kind='stable')
+            rows = rows[order]
+            # The rank of each entry among the entries of the same row
+            # within this chunk
+            group_starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+            group_sizes = np.diff(np.r_[group_starts, len(rows)])
+            ranks = np.arange(len(rows)) - np.repeat(group_starts,
+                                                     group_sizes)
+            positions = cursors[rows] + ranks
+            indices[positions] = \
+                chunk['mesh_id'].map(mesh_mapping).to_numpy()[order]
+            data[positions] = chunk['major'].to_numpy()[order] + 1
+            cursors[rows[group_starts]] += group_sizes
+            pbar.update(len(chunk))
+    report_progress('Filling', n_rows, start_time)
+
+    csr = csr_matrix((data, indices, indptr),
+                     shape=(len(pmids), len(mesh_mapping)))
+    # This sorts the indices within each row and merges any repeated
+    # PMID-MeSH pairs as the previous COO-based construction did
+    csr.sum_duplicates()
 
     print('Saving matrix')
     save_npz('mesh_pmid_matrix.npz', csr)
+    if os.path.exists(BUNDLE_PATH):
+        shutil.rmtree(BUNDLE_PATH)
+    write_bundle(csr, pmids, list(mesh_mapping), mesh_types)
     return csr
 
 
-def get_pvalues(mesh_terms):
-    mesh_terms = set(mesh_terms) - exclude_list
-    # Get index to PMID mappings
-    pmid_reverse = {v: k for k, v in pmid_mapping.items()}
-    mesh_reverse = {v: k for k, v in mesh_mapping.items()}
+def get_fisher_pvalues(overlap_sizes, row_sizes, query_size, total_terms):
+    """Return one-sided Fisher's exact test p-values for a batch of PMIDs.
+
+    This is equivalent to calling scipy.stats.fisher_exact with
+    alternative='greater' on the 2x2 contingency table of each PMID but
+    evaluates the underlying hypergeometric distribution on all PMIDs in a
+    single vectorized call.
+
+    Parameters
+    ----------
+    overlap_sizes : np.ndarray
+        The number of query MeSH terms annotated to each PMID.
+    row_sizes : np.ndarray
+        The total number of MeSH terms annotated to each PMID.
+    query_size : int
+        The number of MeSH terms in the query.
+    total_terms : int
+        The total number of MeSH terms (i.e., the number of columns of
+        the MeSH-PMID matrix).
+
+    Returns
+    -------
+    np.ndarray
+        The p-value for each PMID.
+    """
+    overlap_sizes = np.asarray(overlap_sizes, dtype=np.int64)
+    row_sizes = np.asarray(row_sizes, dtype=np.int64)
+    # The contingency table of each PMID is
+    # [[overlap, query - overlap],
+    #  [row - overlap, total - (query + row - overlap)]]
+    # and, as in fisher_exact, the one-sided p-value is computed from the
+    # hypergeometric CDF of the second column of the table
+    p_values = hypergeom.cdf(query_size - overlap_sizes, total_terms,
+                             query_size, total_terms - row_sizes)
+    # Tables with an empty row or column have a p-value of 1
+    if query_size in {0, total_terms}:
+        return np.ones(len(row_sizes))
+    p_values[(row_sizes == 0) | (row_sizes == total_terms)] = 1.0
+    return np.minimum(p_values, 1.0)
+
+
+def get_top_candidates(coverage_relevant, coverage, limit):
+    """Return a mask of the candidates that can rank in the top `limit`.
+
+    Candidates are ranked first by their relevant and overall coverage and
+    only then by p-value, so any candidate whose coverage keys are below
+    those of the `limit`-th best candidate can be discarded without
+    computing its p-value.
+    """
+    if limit <= 0:
+        return np.zeros(len(coverage), dtype=bool)
+    # Coverage is at most the number of types so this combined key orders
+    # candidates by relevant coverage first and overall coverage second
+    keys = coverage_relevant * (len(MESH_TYPES) + 1) + coverage
+    kth = len(keys) - limit
+    return keys >= np.partition(keys, kth)[kth]
+
+
+def get_pvalues(mesh_terms, limit=None):
+    """Return PMIDs ranked by their relevance to the given MeSH terms.
+
+    Parameters
+    ----------
+    mesh_terms : list[str]
+        The MeSH IDs to find literature for.
+    limit : Optional[int]
+        If given, only the top `limit` PMIDs are returned and p-values and
+        overlap details are only computed for candidates that can rank
+        among them.
+
+    Returns
+    -------
+    pd.DataFrame
+        The ranked PMIDs along with their overlapping MeSH terms, the
+        type coverage of the overlap and the p-value of the overlap.
+    """
+    mesh_terms = sorted(set(mesh_terms) - exclude_list)
+    index = get_mesh_pmid_index()
+    csr = index.csr
     total_pmids, total_topic_terms = csr.shape
     # Map to indices from MeSH terms
-    mesh_indices = [mesh_mapping[mesh_term] for mesh_term in mesh_terms]
+    mesh_indices = index.get_mesh_indices(mesh_terms)
 
-    # Now take only part of the matrix that is defined by the
-    # MeSH terms of interest
-    submatrix = csr[:, mesh_indices]
-
-    # Number of MeSH terms that are present in each PMID
-    publication_counts = np.array(submatrix.sum(axis=1)).flatten()
-    # Get the indices of PMIDs that have at least one of the MeSH terms
+    # Get the indices of PMIDs that have enough of the MeSH terms, where
+    # MeSH terms that are major topics count twice, along with the query
+    # terms that each of them overlaps with
     threshold = len(mesh_terms)-1 if len(mesh_terms) <= 4 else 3
-    nonzero_indices = np.where(publication_counts >= threshold)[0]
-    # Get the counts of MeSH terms for these PMIDs
-    nonzero_counts = publication_counts[nonzero_indices]
-
-    query_set = set(mesh_indices)
-    p_values = []
-    pmids = []
-    all_overlap_mesh_ids = []
-    all_overlap_mesh_type_counts = []
-    all_relevant_mesh_type_coverages = []
-    all_mesh_type_coverages = []
-    for pub_cnt, pub_idx in tqdm.tqdm(zip(nonzero_counts, nonzero_indices)):
-        pmids.append(pmid_reverse[pub_idx])
-        target_set = set(csr[pub_idx].nonzero()[1])
-        overlap_set = query_set & target_set
-        table = np.array([
-            [len(overlap_set),                     # query intersection target
-             len(query_set - target_set)],         # query minus target
-            [len(target_set - query_set),          # target minus query
-             total_topic_terms - len(query_set | target_set)]  # neither query nor target
-        ])
-        res = fisher_exact(table, alternative='greater')
-        p_values.append(res.pvalue)
-
-        overlap_mesh_ids = [mesh_reverse[mesh_idx] for mesh_idx in overlap_set]
-        overlap_mesh_types = [mesh_types[mesh_id] for mesh_id in overlap_mesh_ids]
-        overlap_mesh_type_counts = Counter(overlap_mesh_types)
-        all_relevant_mesh_type_coverages.append(
-            len(set(overlap_mesh_type_counts) & {'geoloc', 'disease', 'pathogen'})
-        )
-        all_mesh_type_coverages.append(len(set(overlap_mesh_type_counts)))
-        all_overlap_mesh_type_counts.append(overlap_mesh_type_counts)
-        all_overlap_mesh_ids.append(overlap_mesh_ids)
+    nonzero_indices, overlap_matrix = \
+        index.get_overlaps(mesh_indices, threshold)
+
+    # Count the types of the overlapping MeSH terms for each PMID by
+    # multiplying with a one-hot encoding of the query term types
+    query_types = index.mesh_type_codes[mesh_indices]
+    query_type_matrix = np.zeros((len(mesh_terms), len(MESH_TYPES)),
+                                 dtype=int)
+    query_type_matrix[np.arange(len(mesh_terms)), query_types] = 1
+    type_counts = np.asarray(overlap_matrix @ query_type_matrix)
+    has_type = type_counts > 0
+    relevant_columns = [MESH_TYPES.index(mesh_type)
+                        for mesh_type in RELEVANT_MESH_TYPES]
+    coverage_relevant = has_type[:, relevant_columns].sum(axis=1)
+    coverage = has_type.sum(axis=1)
+
+    # Only keep candidates that can make it into the top results
+    if limit is not None and limit < len(nonzero_indices):
+        keep = get_top_candidates(coverage_relevant, coverage, limit)
+        nonzero_indices = nonzero_indices[keep]
+        overlap_matrix = overlap_matrix[keep]
+        type_counts = type_counts[keep]
+        coverage_relevant = coverage_relevant[keep]
+        coverage = coverage[keep]
+
+    # The row lengths of the full matrix tell us how many terms each
+    # PMID is annotated with
+    overlap_sizes = np.diff(overlap_matrix.indptr)
+    row_sizes = csr.indptr[nonzero_indices + 1] - \
+        csr.indptr[nonzero_indices]
+    p_values = get_fisher_pvalues(overlap_sizes, row_sizes,
+                                  len(mesh_indices), total_topic_terms)
+
+    query_ids = np.array(mesh_terms, dtype=object)
+    indptr = overlap_matrix.indptr
+    all_overlap_mesh_ids = [
+        query_ids[overlap_matrix.indices[start:end]].tolist()
+        for start, end in zip(indptr[:-1], indptr[1:])
+    ]
+    all_overlap_mesh_type_counts = [
+        Counter({mesh_type: count
+                 for mesh_type, count in zip(MESH_TYPES, row) if count})
+        for row in type_counts.tolist()
+    ]
     # Combine results into an array or DataFrame
     results = pd.DataFrame({
-        'pmid': pmids,
+        'pmid': index.pmids[nonzero_indices].astype(str),
         'overlap': all_overlap_mesh_ids,
         'overlap_counts': all_overlap_mesh_type_counts,
-        'overlap_coverage_relevant': all_relevant_mesh_type_coverages,
-        'overlap_coverage': all_mesh_type_coverages,
+        'overlap_coverage_relevant': coverage_relevant,
+        'overlap_coverage': coverage,
         'pval': p_values
     })
     # Save or view results
@@ -163,26 +586,23 @@ def get_pvalues(mesh_terms):
                          'overlap_coverage', 'pval'],
                         ascending=[False, False, True],
                         inplace=True)
+    if limit is not None:
+        results = results.head(limit)
     return results
 
 
 def get_pubmed_meta(results, limit=10):
-    pmids = results.pmid[:limit]
+    pmids = list(results.pmid[:limit])
     print('Getting metadata for PMIDs')
-    meta = pubmed_client.get_metadata_for_ids(pmids, get_abstracts=True)
+    # Metadata is read from the local store in one batch and only PMIDs
+    # missing from it are fetched from PubMed
+    meta = get_pubmed_store().get_metadata_for_ids(pmids)
     return meta
 
 
 if __name__ == '__main__':
-    if os.path.exists('mesh_pmid_matrix.npz'):
-        csr = load_npz('mesh_pmid_matrix.npz')
-    else:
-        csr = build_mesh_csr()
-    with open('mesh_mapping.json', 'r') as fh:
-        mesh_mapping = json.load(fh)
-    with open('pmid_mapping.json', 'r') as fh:
-        pmid_mapping = json.load(fh)
-    with open('mesh_types.json', 'r') as fh:
-        mesh_types = json.load(fh)
+    if not os.path.exists('mesh_pmid_matrix.npz') \
+            and not os.path.exists(BUNDLE_PATH):
+        build_mesh_csr()
 
     results = get_pvalues(['D007855', 'D015002'])
@@ -0,0 +1,151 @@
+"""
+A precomputed index of the types of MeSH terms, e.g., whether a term is a
+disease, a pathogen or a geolocation, stored as a bitmask per MeSH ID.
+
+Classifying a MeSH term otherwise requires comparing its tree numbers to
+those of the root of each type, which is slow in loops over many terms.
+The index is built once, persisted, and then gives O(1) lookups of single
+terms and vectorized classification of arrays of terms.
+"""
+
+import os
+from functools import lru_cache
+from typing import Dict, Iterable, Tuple
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+MESH_TYPE_INDEX = os.path.join(HERE, 'mesh_type_index.npz')
+
+#: Bit flags of MeSH term types, new types should use the next free bit
+DISEASE = 1
+PATHOGEN = 2
+GEOLOC = 4
+
+#: The MeSH tree roots of geolocations
+GEOLOC_ROOTS = ['D005842']
+#: The MeSH tree roots of pathogens: bacteria and viruses
+PATHOGEN_ROOTS = ['D001419', 'D014780']
+
+
+def get_root_tree_prefixes() -> Dict[int, Tuple[str, ...]]:
+    """Return the tree numbers of the roots of each type, by type flag."""
+    from indra.databases import mesh_client
+
+    return {
+        DISEASE: ('C',),
+        PATHOGEN: tuple(tree_number for root in PATHOGEN_ROOTS
+                        for tree_number in
+                        mesh_client.get_mesh_tree_numbers(root)),
+        GEOLOC: tuple(tree_number for root in GEOLOC_ROOTS
+                      for tree_number in
+                      mesh_client.get_mesh_tree_numbers(root)),
+    }
+
+
+def get_tree_type_mask(tree_numbers: Iterable[str],
+                       root_prefixes: Dict[int, Tuple[str, ...]]) -> int:
+    """Return the bitmask of types of a term given its tree numbers.
+
+    A term has a type if any of its tree numbers starts with the tree
+    number of one of the type's roots, the same test as mesh_client.mesh_isa.
+    """
+    tree_numbers = list(tree_numbers)
+    mask = 0
+    for flag, prefixes in root_prefixes.items():
+        if prefixes and any(tree_number.startswith(prefixes)
+                            for tree_number in tree_numbers):
+            mask |= flag
+    return mask
+
+
+class MeshTypeIndex:
+    """A table of MeSH IDs and the bitmask of their types.
+
+    Parameters
+    ----------
+    mesh_ids :
+        The sorted MeSH IDs that have at least one type.
+    masks :
+        The bitmask of types of each MeSH ID.
+    """
+
+    def __init__(self, mesh_ids: np.ndarray, masks: np.ndarray) -> None:
+        self.mesh_ids = mesh_ids
+        self.masks = masks
+        self._masks_by_id = dict(zip(mesh_ids.tolist(), masks.tolist()))
+
+    @classmethod
+    def build(cls) -> "MeshTypeIndex":
+        """Build the index by classifying all MeSH terms."""
+        from indra.databases import mesh_client
+
+        root_prefixes = get_root_tree_prefixes()
+        masks_by_id = {}
+        for mesh_id in mesh_client.mesh_id_to_name:
+            mask = get_tree_type_mask(
+                mesh_client.get_mesh_tree_numbers(mesh_id), root_prefixes
+            )
+            if mask:
+                masks_by_id[mesh_id] = mask
+        mesh_ids = np.array(sorted(masks_by_id), dtype=str)
+        masks = np.array([masks_by_id[mesh_id] for mesh_id in mesh_ids],
+                         dtype=np.uint8)
+        return cls(mesh_ids, masks)
+
+    def save(self, path: str = MESH_TYPE_INDEX) -> None:
+        """Save the index as an .npz file."""
+        np.savez(path, mesh_ids=self.mesh_ids, masks=self.masks)
+
+    @classmethod
+    def load(cls, path: str = MESH_TYPE_INDEX) -> "MeshTypeIndex":
+        """Load the index from an .npz file."""
+        with np.load(path) as arrays:
+            return cls(arrays['mesh_ids'], arrays['masks'])
+
+    def get_mask(self, mesh_id: str) -> int:
+        """Return the bitmask of types of a MeSH ID, 0 if it has none."""
+        return self._masks_by_id.get(mesh_id, 0)
+
+    def is_disease(self, mesh_id: str) -> bool:
+        return bool(self.get_mask(mesh_id) & DISEASE)
+
+    def is_pathogen(self, mesh_id: str) -> bool:
+        return bool(self.get_mask(mesh_id) & PATHOGEN)
+
+    def is_geoloc(self, mesh_id: str) -> bool:
+        return bool(self.get_mask(mesh_id) & GEOLOC)
+
+    def classify(self, mesh_ids: Iterable[str]) -> np.ndarray:
+        """Return the bitmask of types of each of an array of MeSH IDs.
+
+        Parameters
+        ----------
+        mesh_ids :
+            The MeSH IDs to classify.
+
+        Returns
+        -------
+        :
+            A uint8 array of type bitmasks, 0 for IDs with no type.
+        """
+        mesh_ids = np.asarray(mesh_ids, dtype=str)
+        masks = np.zeros(len(mesh_ids), dtype=np.uint8)
+        if not len(self.mesh_ids):
+            return masks
+        positions = np.searchsorted(self.mesh_ids, mesh_ids)
+        positions = np.minimum(positions, len(self.mesh_ids) - 1)
+        found = self.mesh_ids[positions] == mesh_ids
+        masks[found] = self.masks[positions[found]]
+        return masks
+
+
+@lru_cache(maxsize=1)
+def get_mesh_type_index() -> MeshTypeIndex:
+    """Return the MeSH type index, building and saving it if needed."""
+    if os.path.exists(MESH_TYPE_INDEX):
+        return MeshTypeIndex.load()
+    print('Building MeSH type index')
+    index = MeshTypeIndex.build()
+    index.save()
+    return index
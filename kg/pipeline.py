@@ -0,0 +1,240 @@
+"""
+A runner for build stages that declare the files they read and write.
+
+Stages whose inputs are written by other stages run after them, and
+independent stages run concurrently in a pool of processes. A stage is
+skipped if its outputs exist and the fingerprint of its code and input
+files is the same as when it last ran. The code of a stage is the source
+of the module defining it and of the modules next to it that it imports,
+so that changes to helper functions also run it again.
+"""
+
+import os
+import ast
+import json
+import time
+import hashlib
+import inspect
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Sequence
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+#: The fingerprints of the inputs of stages when they last ran
+BUILD_STATE = os.path.join(HERE, 'build_state.json')
+
+
+class Stage:
+    """A build step with the files it reads and writes.
+
+    Parameters
+    ----------
+    name :
+        The name of the stage.
+    func :
+        A module-level function that runs the stage, called without
+        arguments.
+    inputs :
+        The paths of the files the stage reads, including resource files
+        of packages it uses.
+    outputs :
+        The paths of the files the stage writes.
+    """
+
+    def __init__(self, name: str, func: Callable,
+                 inputs: Sequence[str] = (),
+                 outputs: Sequence[str] = ()) -> None:
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+
+    def __repr__(self) -> str:
+        return f'Stage({self.name!r})'
+
+    def fingerprint(self) -> str:
+        """Return a hash of the stage's code and the contents of its inputs.
+
+        Inputs that don't exist are hashed as missing so that the stage
+        runs again once they appear.
+        """
+        sha = hashlib.sha256()
+        for path in get_local_sources(inspect.getsourcefile(self.func)):
+            sha.update(os.path.basename(path).encode('utf-8'))
+            with open(path, 'rb') as fh:
+                sha.update(fh.read())
+        for path in self.inputs:
+            sha.update(path.encode('utf-8'))
+            if not os.path.exists(path):
+                sha.update(b'missing')
+                continue
+            with open(path, 'rb') as fh:
+                for block in iter(lambda: fh.read(1 << 20), b''):
+                    sha.update(block)
+        return sha.hexdigest()
+
+
+def get_local_sources(path: str) -> List[str]:
+    """Return the path of a module and of the modules in its folder it imports.
+
+    Imports are followed recursively, including those inside functions.
+    """
+    folder = os.path.dirname(os.path.abspath(path))
+    paths = set()
+    remaining = [os.path.abspath(path)]
+    while remaining:
+        path = remaining.pop()
+        if path in paths:
+            continue
+        paths.add(path)
+        with open(path, 'r') as fh:
+            tree = ast.parse(fh.read(), filename=path)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and not node.level:
+                names = [node.module]
+            else:
+                continue
+            for name in names:
+                imported = os.path.join(folder, name + '.py')
+                if os.path.exists(imported):
+                    remaining.append(imported)
+    return sorted(paths)
+
+
+def get_dependencies(stages: List[Stage]) -> Dict[str, List[str]]:
+    """Return the names of the stages each stage depends on.
+
+    A stage depends on the stages that write any of its inputs.
+    """
+    writers = {}
+    for stage in stages:
+        for path in stage.outputs:
+            if path in writers:
+                raise ValueError(f'{path} is written by both '
+                                 f'{writers[path]} and {stage.name}')
+            writers[path] = stage.name
+    dependencies = {
+        stage.name: sorted({writers[path] for path in stage.inputs
+                            if path in writers} - {stage.name})
+        for stage in stages
+    }
+    # Check for cycles by repeatedly removing stages without dependencies
+    remaining = {name: set(deps) for name, deps in dependencies.items()}
+    while remaining:
+        ready = [name for name, deps in remaining.items() if not deps]
+        if not ready:
+            raise ValueError(f'Stages have cyclic dependencies: '
+                             f'{sorted(remaining)}')
+        for name in ready:
+            del remaining[name]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+    return dependencies
+
+
+def run_stage(func: Callable) -> float:
+    """Run a stage function and return its wall time in seconds."""
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def load_state(path: str) -> Dict[str, str]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as fh:
+        return json.load(fh)
+
+
+def save_state(state: Dict[str, str], path: str) -> None:
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as fh:
+        json.dump(state, fh, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def run_pipeline(stages: List[Stage], n_workers: Optional[int] = None,
+                 force: bool = False,
+                 only: Optional[Sequence[str]] = None,
+                 state_path: str = BUILD_STATE) -> Dict[str, dict]:
+    """Run stages in dependency order, skipping those that are up to date.
+
+    Parameters
+    ----------
+    stages :
+        The stages to run.
+    n_workers :
+        The number of stages to run at the same time, by default the
+        number of CPUs.
+    force :
+        If True, run stages even if they are up to date.
+    only :
+        If given, the names of the stages to consider running, other
+        stages are treated as done.
+    state_path :
+        The path to the file storing the fingerprints of stages.
+
+    Returns
+    -------
+    :
+        The status ("ran", "skipped" or "failed") and wall time in
+        seconds of each stage, by name.
+    """
+    dependencies = get_dependencies(stages)
+    stages_by_name = {stage.name: stage for stage in stages}
+    if only is not None:
+        unknown = set(only) - set(stages_by_name)
+        if unknown:
+            raise ValueError(f'Unknown stages: {sorted(unknown)}')
+    state = load_state(state_path)
+    report = {}
+    pending = dict(dependencies)
+    running = {}
+    start = time.perf_counter()
+
+    def finish(name, status, elapsed, fingerprint=None):
+        report[name] = {'status': status, 'time': elapsed}
+        if status == 'ran':
+            state[name] = fingerprint
+            save_state(state, state_path)
+        elif status == 'failed' and state.pop(name, None):
+            save_state(state, state_path)
+        print(f'{name:<30} {status:<8} {elapsed:8.1f}s')
+
+    with ProcessPoolExecutor(n_workers) as pool:
+        while pending or running:
+            ready = [name for name, deps in pending.items()
+                     if all(dep in report for dep in deps)]
+            for name in ready:
+                del pending[name]
+                stage = stages_by_name[name]
+                if any(report[dep]['status'] == 'failed'
+                       for dep in dependencies[name]):
+                    finish(name, 'failed', 0.0)
+                    continue
+                if only is not None and name not in only:
+                    finish(name, 'skipped', 0.0)
+                    continue
+                fingerprint = stage.fingerprint()
+                if not force and state.get(name) == fingerprint and \
+                        all(os.path.exists(path) for path in stage.outputs):
+                    finish(name, 'skipped', 0.0)
+                    continue
+                future = pool.submit(run_stage, stage.func)
+                running[future] = (name, fingerprint)
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, fingerprint = running.pop(future)
+                try:
+                    elapsed = future.result()
+                except Exception as exc:
+                    print(f'Stage {name} failed: {exc!r}')
+                    finish(name, 'failed', 0.0)
+                else:
+                    finish(name, 'ran', elapsed, fingerprint)
+    print(f'Built {len(stages)} stages in '
+          f'{time.perf_counter() - start:.1f}s')
+    return report
@@ -0,0 +1,169 @@
+"""
+A local SQLite store of PubMed article metadata so that literature search
+doesn't depend on network requests to PubMed for every query.
+
+The store is filled in bulk from PubMed baseline/update XML files with
+
+    python pubmed_store.py pubmed24n0001.xml.gz pubmed24n0002.xml.gz ...
+
+and any PMIDs missing from it are fetched from PubMed on demand and
+written back.
+"""
+
+import os
+import gzip
+import json
+import sqlite3
+import argparse
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional
+import xml.etree.ElementTree as ET
+
+import tqdm
+from indra.literature import pubmed_client
+
+#: The default location of the store, can be overridden by PUBMED_METADATA_DB
+PUBMED_METADATA_DB = os.environ.get("PUBMED_METADATA_DB", "pubmed_metadata.db")
+
+#: The maximum number of PMIDs per SQL query, below SQLite's variable limit
+SQL_BATCH_SIZE = 900
+#: The maximum number of PMIDs per PubMed metadata request
+PUBMED_BATCH_SIZE = 200
+
+Metadata = Dict[str, Dict[str, Any]]
+
+
+class PubmedMetadataStore:
+    """A store of PubMed article metadata keyed by PMID.
+
+    Each entry holds the metadata dict in the format returned by
+    pubmed_client.get_metadata_for_ids, along with its title, journal,
+    year and abstract as separate columns.
+
+    Parameters
+    ----------
+    path :
+        The path to the SQLite file of the store.
+    """
+
+    def __init__(self, path: str = PUBMED_METADATA_DB) -> None:
+        self.path = path
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS metadata ("
+                "pmid INTEGER PRIMARY KEY, title TEXT, journal TEXT, "
+                "year INTEGER, abstract TEXT, data TEXT)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get_metadata(self, pmids: Iterable[str]) -> Metadata:
+        """Return the stored metadata for the given PMIDs.
+
+        PMIDs that are not in the store are left out of the result.
+        """
+        pmids = [int(pmid) for pmid in pmids]
+        metadata = {}
+        with self._connect() as conn:
+            for start in range(0, len(pmids), SQL_BATCH_SIZE):
+                batch = pmids[start:start + SQL_BATCH_SIZE]
+                rows = conn.execute(
+                    "SELECT pmid, data FROM metadata WHERE pmid IN "
+                    f"({','.join('?' * len(batch))})",
+                    batch,
+                )
+                for pmid, data in rows:
+                    metadata[str(pmid)] = json.loads(data)
+        return metadata
+
+    def add_metadata(self, metadata: Metadata) -> None:
+        """Add or replace metadata for the PMIDs keying the given dict."""
+        rows = []
+        for pmid, entry in metadata.items():
+            publication_date = entry.get("publication_date") or {}
+            rows.append((
+                int(pmid),
+                entry.get("title"),
+                entry.get("journal_title"),
+                publication_date.get("year"),
+                entry.get("abstract"),
+                json.dumps(entry),
+            ))
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO metadata VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def get_metadata_for_ids(self, pmids: List[str]) -> Optional[Metadata]:
+        """Return metadata for PMIDs, fetching missing ones from PubMed.
+
+        Parameters
+        ----------
+        pmids :
+            The PMIDs to get metadata for.
+
+        Returns
+        -------
+        :
+            The metadata of each PMID, in the order of the given PMIDs.
+            PMIDs that are neither stored nor in PubMed are left out. None
+            if a request to PubMed failed.
+        """
+        pmids = [str(pmid) for pmid in pmids]
+        metadata = self.get_metadata(pmids)
+        missing = [pmid for pmid in pmids if pmid not in metadata]
+        for start in range(0, len(missing), PUBMED_BATCH_SIZE):
+            fetched = pubmed_client.get_metadata_for_ids(
+                missing[start:start + PUBMED_BATCH_SIZE], get_abstracts=True
+            )
+            if fetched is None:
+                return None
+            self.add_metadata(fetched)
+            metadata.update(fetched)
+        return {pmid: metadata[pmid] for pmid in pmids if pmid in metadata}
+
+    def import_xml_files(self, fnames: List[str]) -> int:
+        """Import metadata from PubMed XML files, optionally gzipped.
+
+        Parameters
+        ----------
+        fnames :
+            Paths to PubMed baseline or update files.
+
+        Returns
+        -------
+        :
+            The number of articles imported.
+        """
+        count = 0
+        for fname in tqdm.tqdm(fnames, desc="Importing PubMed XML"):
+            opener = gzip.open if fname.endswith(".gz") else open
+            with opener(fname, "rb") as fh:
+                tree = ET.parse(fh)
+            metadata = pubmed_client.get_metadata_from_xml_tree(
+                tree, get_abstracts=True
+            )
+            self.add_metadata(metadata)
+            count += len(metadata)
+        return count
+
+
+@lru_cache(maxsize=1)
+def get_pubmed_store() -> PubmedMetadataStore:
+    """Return the default PubMed metadata store."""
+    return PubmedMetadataStore()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Import PubMed XML files into the local metadata store."
+    )
+    parser.add_argument("fnames", nargs="+", help="PubMed XML files")
+    parser.add_argument("--db", default=PUBMED_METADATA_DB,
+                        help="Path to the SQLite store")
+    args = parser.parse_args()
+    store = PubmedMetadataStore(args.db)
+    n_imported = store.import_xml_files(args.fnames)
+    print(f"Imported metadata for {n_imported} articles into {args.db}")
@@ -1,11 +1,12 @@
 import os
 from collections import defaultdict
 from itertools import combinations
-import pandas as pd
 import numpy as np
 import gilda
 from scipy.special import logsumexp
 
+from columnar import read_table
+
 HERE = os.path.dirname(__file__)
 ALERT_DATA = os.path.join(HERE, 'promed_alert_edges.tsv')
 MESH_DATA = os.path.join(HERE, 'mesh_hierarchy_nodes.tsv')
@@ -36,7 +37,7 @@ exclude_list = {
 
 
 def get_mesh_types():
-    df = pd.read_csv(MESH_DATA, sep='\t')
+    df = read_table(MESH_DATA, columns=['curie:ID', ':LABEL'])
     mesh_types = {}
     for _, row in df.iterrows():
         curie = row['curie:ID']
@@ -53,7 +54,7 @@ def get_mesh_types():
 # Get co-occurrence scores from KG, i.e., the percentage of alerts in
 # which two terms co-occur.
 def get_coorcurrence(mesh_types):
-    df = pd.read_csv(ALERT_DATA, sep='\t')
+    df = read_table(ALERT_DATA, columns=[':START_ID', ':END_ID'])
     terms_by_alert = defaultdict(set)
     coocurrence_scores = defaultdict(int)
     for _, row in df.iterrows():
@@ -0,0 +1,181 @@
+"""
+Indexes and constraints of the graph.
+
+neo4j-admin import doesn't create any, so without them every lookup of a
+node by CURIE or of alerts by timestamp starts with a scan of all nodes
+with a label. ensure_schema creates them if they don't exist, waits for
+them to come online and checks them with SHOW INDEXES. It runs after the
+import when the Docker image is built and when the API server starts, and
+can be run on its own with
+
+    python schema.py
+"""
+
+import os
+import logging
+import argparse
+from typing import Dict, List, Optional, Tuple
+
+from neo4j import Driver, GraphDatabase
+from neo4j.exceptions import Neo4jError, ServiceUnavailable
+
+logger = logging.getLogger(__name__)
+
+#: The labels of nodes that are looked up by CURIE
+CURIE_LABELS = ['entity', 'disease', 'pathogen', 'geoloc', 'alert',
+                'outbreak', 'indicator']
+#: The seconds to wait for indexes to come online
+AWAIT_TIMEOUT = 300
+
+
+def get_schema() -> List[Tuple[str, str, str, str]]:
+    """Return the indexes of the graph.
+
+    Returns
+    -------
+    :
+        The name, kind ("unique", "range" or "text"), label and property of
+        each index. Unique indexes are backed by uniqueness constraints.
+    """
+    schema = [(f'{label}_curie', 'unique', label, 'curie')
+              for label in CURIE_LABELS]
+    schema.append(('alert_timestamp', 'range', 'alert', 'timestamp'))
+    # Text indexes serve CONTAINS filters on indicator names
+    schema.append(('indicator_name', 'text', 'indicator', 'name'))
+    return schema
+
+
+def get_create_statement(name: str, kind: str, label: str,
+                         property: str) -> str:
+    """Return the Cypher statement creating an index if it doesn't exist."""
+    if kind == 'unique':
+        return (f'CREATE CONSTRAINT {name} IF NOT EXISTS FOR (n:{label}) '
+                f'REQUIRE n.{property} IS UNIQUE')
+    index_type = 'TEXT INDEX' if kind == 'text' else 'INDEX'
+    return (f'CREATE {index_type} {name} IF NOT EXISTS FOR (n:{label}) '
+            f'ON (n.{property})')
+
+
+def run_statement(driver: Driver, statement: str, **params) -> List[list]:
+    """Run a statement in an auto-commit transaction, as schema changes are."""
+    with driver.session() as session:
+        return [record.values()
+                for record in session.run(statement, parameters=params)]
+
+
+def get_index_states(driver: Driver) -> Dict[Tuple[str, str, str], str]:
+    """Return the state of each index by its type, label and property."""
+    rows = run_statement(driver, 'SHOW INDEXES YIELD type, state, '
+                                 'labelsOrTypes, properties')
+    return {
+        (index_type, labels[0], properties[0]): state
+        for index_type, state, labels, properties in rows
+        if labels and properties and len(labels) == len(properties) == 1
+    }
+
+
+def ensure_schema(driver: Driver,
+                  timeout: int = AWAIT_TIMEOUT) -> Dict[str, str]:
+    """Create the indexes of the graph and wait for them to come online.
+
+    A uniqueness constraint that can't be created because existing nodes
+    share a CURIE is replaced by a plain index.
+
+    Parameters
+    ----------
+    driver :
+        The driver of the database.
+    timeout :
+        The seconds to wait for indexes to come online.
+
+    Returns
+    -------
+    :
+        The state of each index by name, all of which are ONLINE.
+    """
+    for name, kind, label, property in get_schema():
+        try:
+            run_statement(driver,
+                          get_create_statement(name, kind, label, property))
+        except Neo4jError as e:
+            if kind != 'unique':
+                raise
+            logger.warning('Could not create constraint %s, creating an '
+                           'index instead: %s', name, e.message)
+            run_statement(driver,
+                          get_create_statement(name, 'range', label, property))
+    run_statement(driver, 'CALL db.awaitIndexes($timeout)', timeout=timeout)
+    index_states = get_index_states(driver)
+    states = {}
+    for name, kind, label, property in get_schema():
+        index_type = 'TEXT' if kind == 'text' else 'BTREE'
+        # Neo4j 5 calls range indexes RANGE instead of BTREE
+        state = index_states.get((index_type, label, property)) or \
+            index_states.get(('RANGE', label, property))
+        states[name] = state
+    not_online = {name: state for name, state in states.items()
+                  if state != 'ONLINE'}
+    if not_online:
+        raise RuntimeError(f'Indexes are not online: {not_online}')
+    return states
+
+
+def get_driver() -> Driver:
+    """Return a driver for the database set by NEO4J_URL and its user."""
+    user = os.environ.get('NEO4J_USER')
+    password = os.environ.get('NEO4J_PASSWORD')
+    return GraphDatabase.driver(
+        os.environ.get('NEO4J_URL', 'bolt://localhost:7687'),
+        auth=(user, password) if user and password else None,
+    )
+
+
+def setup_schema(timeout: int = AWAIT_TIMEOUT) -> Optional[Dict[str, str]]:
+    """Run ensure_schema with a driver of its own when an API server starts.
+
+    Errors are logged instead of raised, so that the API still starts if
+    the database is unavailable or an index can't be set up.
+
+    Parameters
+    ----------
+    timeout :
+        The seconds to wait for indexes to come online.
+
+    Returns
+    -------
+    :
+        The state of each index by name, or None if an error occurred.
+    """
+    driver = get_driver()
+    try:
+        return ensure_schema(driver, timeout)
+    except ServiceUnavailable as e:
+        logger.warning('Could not set up indexes, the database is '
+                       'unavailable: %s', e)
+    except (Neo4jError, RuntimeError) as e:
+        logger.error('Could not set up indexes: %s', e)
+    finally:
+        driver.close()
+    return None
+
+
+def drop_schema(driver: Driver) -> None:
+    """Drop the indexes and constraints created by ensure_schema."""
+    for name, _, _, _ in get_schema():
+        run_statement(driver, f'DROP CONSTRAINT {name} IF EXISTS')
+        run_statement(driver, f'DROP INDEX {name} IF EXISTS')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Create the indexes and constraints of the graph.')
+    parser.add_argument('--timeout', type=int, default=AWAIT_TIMEOUT,
+                        help='The seconds to wait for indexes to come online')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    driver = get_driver()
+    try:
+        for name, state in ensure_schema(driver, args.timeout).items():
+            print(f'{name:<20} {state}')
+    finally:
+        driver.close()
@@ -0,0 +1,150 @@
+"""
+Sorted, deduplicated TSV output for Neo4j import files that doesn't hold
+whole tables in memory.
+
+Rows added to a sink are buffered, and full buffers are sorted and spilled
+to temporary run files on disk. When the sink is closed, the runs are
+merged into the output file, skipping duplicate rows, so that memory use
+depends on the buffer size rather than on the size of the table. A Parquet
+copy of the file is written along with it if enabled, see columnar.py.
+"""
+
+import os
+import csv
+import gzip
+import heapq
+import pickle
+import tempfile
+from typing import Iterable, Iterator, List, Optional, Sequence
+
+from columnar import ParquetSink, get_parquet_path, parquet_output_enabled
+
+#: The default number of rows buffered before a run is spilled to disk
+MAX_BUFFER_ROWS = 1_000_000
+#: The number of rows pickled together in a run file
+RUN_CHUNK_ROWS = 10_000
+
+
+class TsvSink:
+    """A TSV file whose rows are written sorted and without duplicates.
+
+    Use the sink as a context manager, the file is written when it exits
+    without an error. Paths ending in .gz are written gzipped.
+
+    Parameters
+    ----------
+    path :
+        The path of the TSV file to write.
+    header :
+        The header row of the file.
+    max_buffer_rows :
+        The number of distinct rows to keep in memory before spilling them
+        as a sorted run to disk.
+    tmp_dir :
+        The folder to write run files in, by default the folder of path.
+    """
+
+    def __init__(self, path: str, header: Sequence[str],
+                 max_buffer_rows: int = MAX_BUFFER_ROWS,
+                 tmp_dir: Optional[str] = None) -> None:
+        self.path = path
+        self.header = list(header)
+        self.max_buffer_rows = max_buffer_rows
+        self.tmp_dir = tmp_dir or os.path.dirname(os.path.abspath(path))
+        self._buffer = set()
+        self._runs: List[str] = []
+        #: The number of distinct rows written when the sink is closed
+        self.n_rows = 0
+
+    def __enter__(self) -> "TsvSink":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self._remove_runs()
+
+    def add(self, row: Sequence) -> None:
+        """Add a row to the file."""
+        self._buffer.add(tuple(row))
+        if len(self._buffer) >= self.max_buffer_rows:
+            self._spill()
+
+    def add_all(self, rows: Iterable[Sequence]) -> None:
+        """Add rows to the file."""
+        for row in rows:
+            self.add(row)
+
+    def _spill(self) -> None:
+        fd, run_path = tempfile.mkstemp(suffix='.run', dir=self.tmp_dir)
+        self._runs.append(run_path)
+        rows = sorted(self._buffer)
+        self._buffer = set()
+        with os.fdopen(fd, 'wb') as fh:
+            for start in range(0, len(rows), RUN_CHUNK_ROWS):
+                pickle.dump(rows[start:start + RUN_CHUNK_ROWS], fh,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def _read_run(run_path: str) -> Iterator[tuple]:
+        with open(run_path, 'rb') as fh:
+            while True:
+                try:
+                    rows = pickle.load(fh)
+                except EOFError:
+                    return
+                yield from rows
+
+    def _remove_runs(self) -> None:
+        for run_path in self._runs:
+            if os.path.exists(run_path):
+                os.remove(run_path)
+        self._runs = []
+
+    def close(self) -> None:
+        """Merge the buffered rows and spilled runs into the output file."""
+        runs = [self._read_run(run_path) for run_path in self._runs]
+        runs.append(iter(sorted(self._buffer)))
+        self._buffer = set()
+        tmp_path = self.path + '.tmp'
+        opener = gzip.open if self.path.endswith('.gz') else open
+        parquet_path = get_parquet_path(self.path)
+        parquet_sink = ParquetSink(parquet_path, self.header) \
+            if parquet_output_enabled() else None
+        try:
+            with opener(tmp_path, 'wt', newline='') as fh:
+                writer = csv.writer(fh, delimiter='\t')
+                writer.writerow(self.header)
+                previous = None
+                for row in heapq.merge(*runs):
+                    if row != previous:
+                        writer.writerow(row)
+                        self.n_rows += 1
+                        if parquet_sink is not None:
+                            parquet_sink.add(row)
+                        previous = row
+            os.replace(tmp_path, self.path)
+            if parquet_sink is not None:
+                parquet_sink.close()
+            elif os.path.exists(parquet_path):
+                # Remove a copy left from an earlier build so that readers
+                # don't prefer it over the new TSV file
+                os.remove(parquet_path)
+        except BaseException:
+            if parquet_sink is not None:
+                parquet_sink.abort()
+            raise
+        finally:
+            self._remove_runs()
+
+
+def write_tsv(path: str, header: Sequence[str],
+              rows: Iterable[Sequence]) -> int:
+    """Write rows to a TSV file, sorted and without duplicates.
+
+    Returns the number of distinct rows written.
+    """
+    with TsvSink(path, header) as sink:
+        sink.add_all(rows)
+    return sink.n_rows
@@ -16,4 +16,8 @@ done
 neo4j status
 
 echo "Running REST API"
-gunicorn -t 600 --bind 0.0.0.0:8771 api:app
+if [ "${API_SERVER:-gunicorn}" = "uvicorn" ]; then
+  uvicorn --host 0.0.0.0 --port 8771 asgi:app
+else
+  gunicorn -c gunicorn.conf.py -t 600 --bind 0.0.0.0:8771 api:app
+fi
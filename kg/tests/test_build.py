@@ -0,0 +1,129 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+
+import build
+from build import get_geoname_mesh_crosswalk, get_indicator_relations, \
+    get_outbreak_relations, get_transitive_closure, ground_geoname
+
+CURIE_BY_NAME = {"France": "MESH:D005602", "Spain": "MESH:D013030"}
+
+
+def get_indicator_df(countries, values):
+    return pd.DataFrame({
+        "Country Name": countries,
+        "Country Code": ["XXX"] * len(countries),
+        "Series Name": ["Population"] * len(countries),
+        "Series Code": ["SP.POP"] * len(countries),
+        "2018 [YR2018]": [value[0] for value in values],
+        "2019 [YR2019]": [value[1] for value in values],
+    })
+
+
+def test_indicator_relations():
+    indicator_df = get_indicator_df(["France", "Spain"],
+                                    [(1.5, np.nan), (2.0, 3.25)])
+    nodes, edges = get_indicator_relations(indicator_df, CURIE_BY_NAME)
+    assert set(nodes) == {("wdi:SP.POP", "Population", "indicator")}
+    assert set(edges) == {
+        ("MESH:D005602", '{"2018": 1.5}', "has_indicator", "wdi:SP.POP"),
+        ("MESH:D013030", '{"2018": 2.0, "2019": 3.25}', "has_indicator",
+         "wdi:SP.POP"),
+    }
+
+
+def test_indicator_relations_empty_table():
+    indicator_df = get_indicator_df([], [])
+    nodes, edges = get_indicator_relations(indicator_df, CURIE_BY_NAME)
+    assert not set(nodes)
+    assert not set(edges)
+
+
+def test_indicator_relations_ungrounded_countries():
+    indicator_df = get_indicator_df(["Atlantis"], [(1.0, 2.0)])
+    nodes, edges = get_indicator_relations(indicator_df, CURIE_BY_NAME)
+    assert not set(nodes)
+    assert not set(edges)
+
+
+def test_indicator_relations_all_missing_values():
+    indicator_df = get_indicator_df(["France", "Spain"],
+                                    [(np.nan, np.nan), (np.nan, np.nan)])
+    nodes, edges = get_indicator_relations(indicator_df, CURIE_BY_NAME)
+    assert set(nodes) == {("wdi:SP.POP", "Population", "indicator")}
+    assert set(edges) == {
+        ("MESH:D005602", "{}", "has_indicator", "wdi:SP.POP"),
+        ("MESH:D013030", "{}", "has_indicator", "wdi:SP.POP"),
+    }
+
+
+def test_geoname_mesh_crosswalk_resolves_saved_groundings(tmp_path):
+    path = tmp_path / "geoname_groundings.tsv"
+    path.write_text("text:string\tmesh:ID\n"
+                    "France\tMESH:D005602\n"
+                    "Atlantis\t\n")
+    references = {"geonames:1": "France", "geonames:2": "Atlantis"}
+    mesh_node_df = pd.DataFrame({
+        "curie:ID": ["MESH:D005602", "MESH:D000001"],
+        "name:string": ["France", "Atlantis"],
+        ":LABEL": ["geoloc", "geoloc"],
+    })
+    crosswalk = get_geoname_mesh_crosswalk(references, mesh_node_df,
+                                           path=str(path))
+    assert crosswalk == {"geonames:1": "MESH:D005602",
+                         "geonames:2": "MESH:D000001"}
+    # Groundings to MeSH terms that are no longer nodes aren't used
+    crosswalk = get_geoname_mesh_crosswalk(references, mesh_node_df[1:],
+                                           path=str(path))
+    assert crosswalk == {"geonames:1": "", "geonames:2": "MESH:D000001"}
+
+
+class MockGrounder:
+    """A grounder returning a MeSH and a non-MeSH term for known texts."""
+
+    groundings = {"France": ("MESH", "D005602", "mesh"),
+                  "Atlantis": ("MESH", "D000001", "efo")}
+
+    def ground(self, text, namespaces=None):
+        if text not in self.groundings:
+            return []
+        db, id, source = self.groundings[text]
+        term = SimpleNamespace(db=db, id=id, source=source)
+        return [SimpleNamespace(term=term)]
+
+
+def test_ground_geoname(monkeypatch):
+    monkeypatch.setattr(build, "get_grounder", MockGrounder)
+    assert ground_geoname("France") == "MESH:D005602"
+    # Groundings to MeSH terms through mappings from other sources are
+    # not used
+    assert ground_geoname("Atlantis") is None
+    assert ground_geoname("Nowhere") is None
+
+
+def test_outbreak_relations():
+    outbreak_df = pd.DataFrame({
+        "ID": [1, 1, 2],
+        "outbreakName": ["Ebola 2014", "Ebola", "Zika 2016"],
+        "archiveNumber": ["20140101.1", "20140102.2", "20160101.3"],
+    })
+    nodes, edges = get_outbreak_relations(outbreak_df)
+    assert set(nodes) == {("outbreak:1", "Ebola 2014", "outbreak"),
+                          ("outbreak:2", "Zika 2016", "outbreak")}
+    assert set(edges) == {
+        ("promed:20140101.1", "has_outbreak", "outbreak:1"),
+        ("promed:20140102.2", "has_outbreak", "outbreak:1"),
+        ("promed:20160101.3", "has_outbreak", "outbreak:2"),
+    }
+
+
+def test_transitive_closure():
+    # 0 -> 1 -> 2 -> 1 has a cycle and 3 is isolated
+    adjacency = csr_matrix(([1, 1, 1], ([0, 1, 2], [1, 2, 1])), shape=(4, 4))
+    closure = get_transitive_closure(adjacency).toarray()
+    assert closure.tolist() == [[1, 1, 1, 0],
+                                [0, 1, 1, 0],
+                                [0, 1, 1, 0],
+                                [0, 0, 0, 1]]
@@ -0,0 +1,63 @@
+import asyncio
+import logging
+
+from neo4j import AsyncGraphDatabase, GraphDatabase
+
+from client import PoolMetrics
+
+# Drivers don't connect until a session needs a connection
+URL = "bolt://localhost:7687"
+
+
+def test_pool_metrics_driver_internals(caplog):
+    driver = GraphDatabase.driver(URL)
+    metrics = PoolMetrics()
+    try:
+        with caplog.at_level(logging.WARNING, logger="client"):
+            metrics.instrument(driver)
+            report = metrics.report(driver, 10, 5.0)
+    finally:
+        driver.close()
+    # The pinned driver has the internals the metrics use
+    assert not caplog.records
+    assert report == {
+        "max_pool_size": 10,
+        "acquisition_timeout": 5.0,
+        "in_use": 0,
+        "idle": 0,
+        "acquisitions": 0,
+        "wait_time_total": 0.0,
+        "wait_time_mean": 0.0,
+        "wait_time_max": 0.0,
+    }
+
+
+def test_pool_metrics_async_driver_internals(caplog):
+    async def get_report():
+        driver = AsyncGraphDatabase.driver(URL)
+        metrics = PoolMetrics()
+        try:
+            metrics.instrument(driver)
+            return metrics.report(driver, 10, 5.0)
+        finally:
+            await driver.close()
+
+    with caplog.at_level(logging.WARNING, logger="client"):
+        report = asyncio.run(get_report())
+    assert not caplog.records
+    assert report["in_use"] == 0
+    assert report["acquisitions"] == 0
+
+
+def test_pool_metrics_missing_internals(caplog):
+    driver = object()
+    metrics = PoolMetrics()
+    with caplog.at_level(logging.WARNING, logger="client"):
+        metrics.instrument(driver)
+        report = metrics.report(driver, 10, 5.0)
+        metrics.report(driver, 10, 5.0)
+    assert len(caplog.records) == 2
+    assert report["in_use"] is None
+    assert report["idle"] is None
+    assert report["acquisitions"] is None
+    assert report["wait_time_mean"] is None
@@ -0,0 +1,45 @@
+import sys
+import importlib
+
+from pipeline import Stage, get_local_sources
+
+
+def import_stage_module(tmp_path, monkeypatch):
+    (tmp_path / 'stage_helpers.py').write_text(
+        'def get_rows():\n    return [1, 2]\n')
+    (tmp_path / 'stage_module.py').write_text(
+        'from stage_helpers import get_rows\n\n\n'
+        'def assemble():\n    return get_rows()\n')
+    monkeypatch.syspath_prepend(str(tmp_path))
+    for name in ('stage_module', 'stage_helpers'):
+        sys.modules.pop(name, None)
+    return importlib.import_module('stage_module')
+
+
+def test_local_sources(tmp_path, monkeypatch):
+    module = import_stage_module(tmp_path, monkeypatch)
+    assert get_local_sources(module.__file__) == [
+        str(tmp_path / 'stage_helpers.py'), str(tmp_path / 'stage_module.py')
+    ]
+
+
+def test_fingerprint_tracks_helpers(tmp_path, monkeypatch):
+    module = import_stage_module(tmp_path, monkeypatch)
+    stage = Stage('assemble', module.assemble)
+    fingerprint = stage.fingerprint()
+    assert stage.fingerprint() == fingerprint
+    (tmp_path / 'stage_helpers.py').write_text(
+        'def get_rows():\n    return [1, 2, 3]\n')
+    assert stage.fingerprint() != fingerprint
+
+
+def test_fingerprint_tracks_inputs(tmp_path, monkeypatch):
+    module = import_stage_module(tmp_path, monkeypatch)
+    input_path = tmp_path / 'input.tsv'
+    stage = Stage('assemble', module.assemble, inputs=[str(input_path)])
+    missing_fingerprint = stage.fingerprint()
+    input_path.write_text('a\tb\n')
+    fingerprint = stage.fingerprint()
+    assert fingerprint != missing_fingerprint
+    input_path.write_text('a\tc\n')
+    assert stage.fingerprint() != fingerprint
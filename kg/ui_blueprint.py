@@ -0,0 +1,20 @@
+"""
+This module defines the landing page and web UI. They don't query the
+graph, so they can be served without a database client, e.g., by the
+ASGI app in asgi.py.
+"""
+
+from flask import Blueprint, render_template
+
+
+ui_blueprint = Blueprint("ui", __name__)
+
+
+@ui_blueprint.route("/")
+def landing_page():
+    return render_template("landing_page.html")
+
+
+@ui_blueprint.route("/ui")
+def ui_page():
+    return render_template("ui.html")
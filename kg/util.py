@@ -1,25 +1,27 @@
-from indra.databases import mesh_client
+from functools import lru_cache
+
+from mesh_type_index import get_mesh_type_index
 
 
 def is_geoloc(x_db, x_id):
     if x_db == 'MESH':
-        return mesh_client.mesh_isa(x_id, 'D005842')
+        return get_mesh_type_index().is_geoloc(x_id)
     return False
 
 
 def is_pathogen(x_db, x_id):
     if x_db == 'MESH':
-        return mesh_client.mesh_isa(x_id, 'D001419') or \
-            mesh_client.mesh_isa(x_id, 'D014780')
+        return get_mesh_type_index().is_pathogen(x_id)
     return False
 
 
 def is_disease(x_db, x_id):
     if x_db == 'MESH':
-        return mesh_client.is_disease(x_id)
+        return get_mesh_type_index().is_disease(x_id)
     return False
 
 
+@lru_cache(maxsize=None)
 def get_mesh_type(x_db, x_id):
     if is_disease(x_db, x_id):
         return 'disease'
@@ -3,15 +3,20 @@ import os
 import re
 import glob
 import json
+import hashlib
 import pickle
+import argparse
 import datetime
 from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 import tqdm
 import gilda
 import pystow
 from indra.sources.eidos.cli import extract_from_directory
 
+from kg.columnar import get_parquet_path, write_terms_by_alert
+
 # This broader list contains useful ontologies, alternatively, we can just
 # use MeSH
 #GILDA_NS = ['MESH', 'EFO', 'HP', 'DOID', 'GO']
@@ -22,6 +27,9 @@ CHAIN_DATA_PATH = os.path.join(os.pardir, 'CHAIN', 'Data', 'ProMED')
 # This is a folder for large data artifacts, depending on pystow
 # configuration, this is by default inside ~/.data
 DATA_PATH = pystow.module('outbreak_kg')
+# The name of the file in DATA_PATH storing content hashes of alerts as of
+# the last run
+ALERT_HASHES = 'alert_hashes.json'
 
 
 def parse_contents_from_body(body):
@@ -105,7 +113,165 @@ def dump_alert_json(alert, fname):
         json.dump(alert, fh, indent=1, default=str)
 
 
+def init_ner_worker():
+    """Load the Gilda grounder once when a worker process starts."""
+    gilda.get_grounder()
+
+
+def annotate_alert(alert):
+    return [
+        # TODO: consider adding header['subject'] annotations here
+        {'title': annotate(content['title']),
+         'content': annotate(content['content'])}
+        for content in alert['body']
+    ]
+
+
+def annotate_shard(alerts_by_archive, shard_fname):
+    """Annotate a shard of alerts and checkpoint the results to disk.
+
+    Parameters
+    ----------
+    alerts_by_archive : dict[str, list[dict]]
+        Alerts to annotate, grouped by archive number.
+    shard_fname : pathlib.Path
+        The file to pickle the annotations of the shard into.
+
+    Returns
+    -------
+    dict[str, list[dict]]
+        The annotations of the title and content of each block of the
+        alerts, by archive number.
+    """
+    annotations = {}
+    for archive_number, alerts in alerts_by_archive.items():
+        annotations[archive_number] = [
+            annotation for alert in alerts
+            for annotation in annotate_alert(alert)
+        ]
+    # Write to a temporary file first so that a crash never leaves a
+    # truncated shard behind
+    tmp_fname = shard_fname.with_suffix('.tmp')
+    with open(tmp_fname, 'wb') as fh:
+        pickle.dump(annotations, fh)
+    os.replace(tmp_fname, shard_fname)
+    return annotations
+
+
+def load_ner_shards(shard_path):
+    """Return annotations from all shards checkpointed in a folder.
+
+    Shards are loaded in the order they were created so that annotations
+    from later shards supersede earlier ones.
+    """
+    annotations = {}
+    for fname in sorted(shard_path.glob('shard_*.pkl')):
+        with open(fname, 'rb') as fh:
+            annotations.update(pickle.load(fh))
+    return annotations
+
+
+def get_alert_hashes(alerts):
+    """Return a hash of the parsed content of the alerts by archive number.
+
+    Parameters
+    ----------
+    alerts : list[dict]
+        The parsed alerts.
+
+    Returns
+    -------
+    dict[str, str]
+        The SHA-256 hash of all alerts with a given archive number.
+    """
+    alerts_by_archive = defaultdict(list)
+    for alert in alerts:
+        alerts_by_archive[alert['header']['archive_number']].append(alert)
+    return {
+        archive_number: hashlib.sha256(
+            json.dumps(archive_alerts, sort_keys=True,
+                       default=str).encode('utf-8')).hexdigest()
+        for archive_number, archive_alerts in alerts_by_archive.items()
+    }
+
+
+def annotate_alerts(alerts, n_workers=None, shard_size=500,
+                    reannotate=None):
+    """Run NER on alerts in parallel, resuming from earlier checkpoints.
+
+    Alerts are grouped by archive number and split into shards that are
+    annotated by a pool of worker processes, each checkpointing its results
+    into the ner_shards folder. Archive numbers that have already been
+    annotated in an earlier run are skipped unless they are to be
+    reannotated, in which case the new shard supersedes the earlier one.
+
+    Parameters
+    ----------
+    alerts : list[dict]
+        The parsed alerts to annotate.
+    n_workers : Optional[int]
+        The number of worker processes, by default the number of CPUs.
+    shard_size : int
+        The number of archive numbers per shard.
+    reannotate : Optional[set[str]]
+        Archive numbers to annotate again even if they have been annotated
+        before, e.g., because their content changed.
+
+    Returns
+    -------
+    dict[str, list[dict]]
+        The annotations of the title and content of each block of the
+        alerts, by archive number.
+    """
+    shard_path = DATA_PATH.join('ner_shards')
+    annotations = load_ner_shards(shard_path)
+    alerts_by_archive = defaultdict(list)
+    for alert in alerts:
+        alerts_by_archive[alert['header']['archive_number']].append(alert)
+    reannotate = reannotate or set()
+    pending = [archive_number for archive_number in alerts_by_archive
+               if archive_number not in annotations
+               or archive_number in reannotate]
+    print(f'Found annotations for {len(annotations)} archive numbers, '
+          f'annotating {len(pending)} more')
+    # Shards finish out of order so we continue after the largest index
+    first_shard = max((int(fname.stem.split('_')[1])
+                       for fname in shard_path.glob('shard_*.pkl')),
+                      default=-1) + 1
+    with ProcessPoolExecutor(max_workers=n_workers,
+                             initializer=init_ner_worker) as executor:
+        futures = []
+        for idx, start in enumerate(range(0, len(pending), shard_size)):
+            shard = {archive_number: alerts_by_archive[archive_number]
+                     for archive_number in pending[start:start + shard_size]}
+            shard_fname = shard_path.joinpath(
+                f'shard_{first_shard + idx:06d}.pkl')
+            futures.append(executor.submit(annotate_shard, shard,
+                                           shard_fname))
+        for future in tqdm.tqdm(as_completed(futures), total=len(futures),
+                                desc='Annotating alerts'):
+            annotations.update(future.result())
+    # Return annotations in the order of the alerts
+    return {archive_number: annotations[archive_number]
+            for archive_number in alerts_by_archive}
+
+
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--workers', type=int,
+                        help='Number of NER worker processes, by default '
+                             'the number of CPUs')
+    parser.add_argument('--shard-size', type=int, default=500,
+                        help='Number of archive numbers per NER checkpoint')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Dump the terms of alerts that are new or '
+                             'changed since the last run into a separate '
+                             'delta file')
+    parser.add_argument('--parquet', action='store_true',
+                        help='Also write the terms by alert as Parquet '
+                             'tables next to the JSON files')
+    args = parser.parse_args()
+
     # Process original JSON files into alert text files
     fnames = glob.glob(os.path.join(CHAIN_DATA_PATH, '*.json'))
 
@@ -139,16 +305,28 @@ if __name__ == '__main__':
                                                 name=f'{archive_number}.txt'))
             chain_alert_json_index[archive_number].append(chain_alert_json)
 
-    # Run NER on alerts
-    annotations = defaultdict(list)
-    for alert in tqdm.tqdm(alerts, desc='Annotating alerts'):
-        for content in alert['body']:
-            annotations[alert['header']['archive_number']].append(
-                    # TODO: consider adding header['subject'] annotations here
-                    {'title': annotate(content['title']),
-                     'content': annotate(content['content'])}
-                )
-    annotations = dict(annotations)
+    # Find alerts that are new or whose content changed since the last run
+    alert_hashes = get_alert_hashes(alerts)
+    alert_hashes_fname = DATA_PATH.join(name=ALERT_HASHES)
+    if alert_hashes_fname.exists():
+        with open(alert_hashes_fname, 'r') as fh:
+            previous_alert_hashes = json.load(fh)
+    else:
+        previous_alert_hashes = {}
+    changed_alerts = {archive_number
+                      for archive_number, alert_hash in alert_hashes.items()
+                      if previous_alert_hashes.get(archive_number)
+                      != alert_hash}
+    print(f'Found {len(changed_alerts)} new or changed alerts')
+
+    # Run NER on alerts. Alerts whose content changed are always annotated
+    # again since the hashes saved below mark all alerts as up to date. New
+    # alerts are annotated anyway unless a checkpoint of an interrupted run
+    # already has them.
+    annotations = annotate_alerts(
+        alerts, n_workers=args.workers, shard_size=args.shard_size,
+        reannotate={archive_number for archive_number in changed_alerts
+                    if archive_number in previous_alert_hashes})
     with open(DATA_PATH.join(name='annotations.pkl'), 'wb') as fh:
         pickle.dump(annotations, fh)
 
@@ -177,8 +355,22 @@ if __name__ == '__main__':
         terms_by_alert[alert_id] = sorted(terms)
 
     # Dump terms by alert into a JSON file
-    with open('output/promed_ner_terms_by_alert.json', 'w') as fh:
-        json.dump(terms_by_alert, fh, indent=2)
+    terms_fnames = {'output/promed_ner_terms_by_alert.json': terms_by_alert}
+    if args.incremental:
+        terms_fnames['output/promed_ner_terms_by_alert_delta.json'] = {
+            alert_id: terms for alert_id, terms in terms_by_alert.items()
+            if alert_id in changed_alerts
+        }
+    for terms_fname, terms in terms_fnames.items():
+        with open(terms_fname, 'w') as fh:
+            json.dump(terms, fh, indent=2)
+        if args.parquet:
+            write_terms_by_alert(terms, terms_fname)
+        elif os.path.exists(get_parquet_path(terms_fname)):
+            # Readers prefer the Parquet table, so an old one is removed
+            os.remove(get_parquet_path(terms_fname))
+    with open(alert_hashes_fname, 'w') as fh:
+        json.dump(alert_hashes, fh, indent=1)
 
     # Dump stats into a spreadsheet
     text_stats_cnt = Counter(text_stats)